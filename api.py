@@ -1,57 +1,50 @@
 from datetime import timedelta
-import pathlib
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
-import crud
-from models import User
+from typing import List, Optional
+from database import get_session
+from replicas import get_read_session
+import async_crud
+from async_crud import AnySession
 import schemas
-from auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_current_user, verify_password
-
-from fastapi_mail import MessageSchema, FastMail, ConnectionConfig
+from auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_current_user, get_password_hash_async, get_stream_user, verify_password_async
+
+import avatars
+import events
+import models
+import bulk_import
+import export
+import outbox
+import replicas
+import response_cache
+import serialization
+import sparse_fields
 import jwt
 import time
 
 from slowapi import Limiter
-from slowapi.util import get_remote_address
+import rate_limit
 from fastapi import FastAPI, Depends, Query
-from fastapi import Request
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from pagination import decode_cursor, encode_cursor, set_next_cursor
+from query_stats import query_budget
+from metrics import streaming
 
-import cloudinary
-from cloudinary.uploader import upload
 from fastapi import UploadFile, File
 from decouple import config
 
 router = APIRouter()
 
-limiter = Limiter(key_func=get_remote_address)
-
-SECRET_KEY = config('SECRET_KEY')
-
-conf = ConnectionConfig(
-    MAIL_USERNAME= config('MAIL_USERNAME'),
-    MAIL_PASSWORD= config('MAIL_PASSWORD'),
-    MAIL_FROM= config('MAIL_FROM'),
-    MAIL_PORT=465,
-    MAIL_SERVER="smtp.meta.ua",
-    MAIL_FROM_NAME="Example email",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=pathlib.Path(__file__).parent / 'templates',
-)
+RATE_LIMIT_STORAGE = config('RATE_LIMIT_STORAGE', default="memory://")
+RATE_LIMIT_KEY = config('RATE_LIMIT_KEY', default="ip")
 
-cloudinary.config( 
-  cloud_name = config('CLOUDINARY_CLOUD_NAME'), 
-  api_key = config('CLOUDINARY_API_KEY'), 
-  api_secret = config('CLOUDINARY_API_SECRET') 
-)
+limiter = Limiter(key_func=rate_limit.KEY_FUNCS[RATE_LIMIT_KEY], storage_uri=RATE_LIMIT_STORAGE,
+                  storage_options=rate_limit.storage_options(RATE_LIMIT_STORAGE))
 
+SECRET_KEY = config('SECRET_KEY')
+MAX_BATCH_IDS = config('MAX_BATCH_IDS', default=500, cast=int)
 
-fastmail = FastMail(conf)
 
 
 def create_confirmation_token(email: str):
@@ -72,32 +65,33 @@ def create_confirmation_token(email: str):
     return token
 
 
-async def send_email_confirmation(email: str, confirmation_token: str, background_tasks: BackgroundTasks):
+def confirmation_email(email: str) -> schemas.EmailMessage:
     """
-    Надсилає електронний лист для підтвердження електронної пошти користувача.
+    Формує лист із посиланням для підтвердження електронної пошти користувача.
 
     Параметри:
         email (str): Електронна пошта користувача, яка повинна бути підтверджена.
-        confirmation_token (str): Токен підтвердження, який користувач повинен підтвердити.
-        background_tasks (BackgroundTasks): Об'єкт для виконання фонових завдань.
 
     Повертає:
-        None
+        schemas.EmailMessage: Лист для запису в чергу відправлення.
     """
-    message = MessageSchema(
+    confirmation_token = create_confirmation_token(email)
+    return schemas.EmailMessage(
+        recipient=email,
         subject="Email Confirmation",
-        recipients=[email],
         body=f"Click the following link to confirm your email: http://127.0.0.1:8000/confirm?token={confirmation_token}",
         subtype="html"
     )
-    await fastmail.send_message(message)
 
 @router.post("/contacts/", response_model=schemas.Contact)
-def create_contact(contact: schemas.ContactCreate, user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
+@query_budget(4)
+async def create_contact(request: Request, response: Response, contact: schemas.ContactCreate, user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_session)):
     """
     Створює новий контакт для вказаного користувача.
 
     Параметри:
+        request (Request): Запит (клієнт закріплюється за основною базою).
+        response (Response): Відповідь, у яку записується cookie закріплення.
         contact (schemas.ContactCreate): Дані нового контакту.
         user (schemas.User): Залогінений користувач.
         db (Session): Сесія бази даних.
@@ -106,23 +100,223 @@ def create_contact(contact: schemas.ContactCreate, user: schemas.User = Depends(
         schemas.Contact: Створений контакт.
     """
     user_id = user.id
-    new_contact = crud.create_contact(db, contact, user_id)
-    contacts = crud.get_contacts(db)
-    
+    new_contact = await async_crud.create_contact(db, contact, user_id)
+    replicas.pin_to_primary(request, response)
     return new_contact
 
 
 
+@router.post("/contacts/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_contacts(request: Request, format: Optional[str] = Query(None),
+                               user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_session)):
+    """
+    Імпортує контакти з потокового тіла запиту у форматі CSV або NDJSON.
+
+    Формат визначається параметром ``format`` або заголовком Content-Type.
+    Рядки з уже наявною електронною поштою чи номером телефону або з
+    некоректними даними пропускаються і повертаються у звіті.
+
+    Параметри:
+        request (Request): Запит із вмістом файлу.
+        format (Optional[str]): ``csv`` або ``ndjson``.
+        user (schemas.User): Залогінений користувач.
+        db (Session): Сесія бази даних.
+
+    Повертає:
+        schemas.BulkImportResult: Звіт про імпорт.
+    """
+    data_format = bulk_import.detect_format(request, format)
+    return await bulk_import.import_contacts(request, data_format, db, user.id)
+
+
 @router.get("/contacts/", response_model=List[schemas.Contact])
+@query_budget(2)
 @limiter.limit("10 per minute")
-def read_contacts(request: Request, skip: int = Query(0, alias="page", ge=0), limit: int = Query(10, le=100), 
-                db: Session = Depends(get_db)):
-    contacts = crud.get_contacts(db, skip, limit)
+@response_cache.cached(sparse_fields.list_response_model, owner="current_user")
+async def read_contacts(request: Request, response: Response, skip: int = Query(0, alias="page", ge=0), limit: int = Query(10, le=100),
+                after: Optional[str] = Query(None), fields: sparse_fields.Projection = Depends(sparse_fields.contact_fields),
+                current_user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_read_session)):
+    """
+    Повертає сторінку контактів поточного користувача.
+
+    Якщо передано курсор ``after``, сторінка шукається за первинним ключем
+    (keyset-пагінація), і її вартість не залежить від глибини. Курсор наступної
+    сторінки повертається в заголовку ``X-Next-Cursor``.
+
+    Параметри:
+        request (Request): Запит (потрібен для обмеження частоти та кешу відповідей).
+        response (Response): Відповідь, до якої додається курсор.
+        skip (int): Зсув для пагінації зі зсувом.
+        limit (int): Розмір сторінки.
+        after (Optional[str]): Курсор з попередньої сторінки.
+        fields (sparse_fields.Projection): Поля контакту з параметра ``fields``.
+        current_user (schemas.User): Залогінений користувач.
+        db (Session): Сесія бази даних.
+
+    Повертає:
+        List[schemas.Contact]: Сторінка контактів.
+    """
+    after_id = decode_cursor(after) if after else None
+    contacts = await async_crud.get_contacts(db, current_user.id, skip, limit, after_id=after_id, columns=fields.columns)
+    set_next_cursor(response, contacts, limit)
     return contacts
 
+@router.get("/contacts/export")
+async def export_contacts(format: str = Query("csv", pattern="^(csv|ndjson)$"),
+                          user: schemas.User = Depends(get_current_user)):
+    """
+    Вивантажує всі контакти користувача потоком у форматі CSV або NDJSON.
+
+    Параметри:
+        format (str): ``csv`` або ``ndjson``.
+        user (schemas.User): Залогінений користувач.
+
+    Повертає:
+        StreamingResponse: Файл з контактами.
+    """
+    return StreamingResponse(
+        export.stream_contacts(user.id, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'},
+    )
+
+@router.get("/contacts/batch", response_model=schemas.ContactBatch)
+@query_budget(2)
+@response_cache.cached(sparse_fields.batch_response_model, owner="current_user")
+async def read_contacts_batch(request: Request, ids: str = Query(..., pattern=r"^\d+(,\d+)*$"),
+                              fields: sparse_fields.Projection = Depends(sparse_fields.contact_fields),
+                              current_user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_session)):
+    """
+    Повертає кілька контактів користувача одним запитом до бази.
+
+    Власник перевіряється в самому SQL-запиті, тож ідентифікатори чужих і
+    неіснуючих контактів не розрізняються і повертаються в ``missing``.
+
+    Параметри:
+        request (Request): Запит (потрібен для кешу відповідей).
+        ids (str): Ідентифікатори контактів через кому, не більше ``MAX_BATCH_IDS``.
+        fields (sparse_fields.Projection): Поля контакту з параметра ``fields``.
+        current_user (schemas.User): Залогінений користувач.
+        db (Session): Сесія бази даних.
+
+    Повертає:
+        schemas.ContactBatch: Знайдені контакти та ідентифікатори, яких не знайдено.
+    """
+    contact_ids = list(dict.fromkeys(int(contact_id) for contact_id in ids.split(",")))
+    if len(contact_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    contacts = await async_crud.get_contacts_by_ids(db, current_user.id, contact_ids, columns=fields.columns)
+    found = {contact.id for contact in contacts}
+    return {"contacts": contacts, "missing": [contact_id for contact_id in contact_ids if contact_id not in found]}
+
+@router.get("/contacts/changes", response_model=schemas.ContactChanges)
+@query_budget(3)
+@response_cache.cached(schemas.ContactChanges, owner="current_user")
+async def read_contact_changes(request: Request, since: Optional[str] = Query(None), limit: int = Query(100, ge=1, le=1000),
+                               current_user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_read_session)):
+    """
+    Повертає зміни контактів користувача після курсора ``since``.
+
+    Кожна зміна - це поточний стан створеного чи зміненого контакту або
+    позначка про видалення, впорядковані за ревізією. Без ``since``
+    повертаються всі контакти (перша синхронізація). Курсор ``cursor`` з
+    відповіді передається в наступний запит; ``has_more`` означає, що зміни
+    ще лишились.
+
+    Параметри:
+        request (Request): Запит (потрібен для кешу відповідей).
+        since (Optional[str]): Курсор з попередньої відповіді.
+        limit (int): Максимальна кількість змін у відповіді.
+        current_user (schemas.User): Залогінений користувач.
+        db (Session): Сесія бази даних.
+
+    Повертає:
+        schemas.ContactChanges: Зміни, курсор і ознака наступної сторінки.
+    """
+    since_revision = decode_cursor(since, kind="rev") if since else -1
+    changes = await async_crud.get_contact_changes(db, current_user.id, since_revision, limit)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    return {
+        "changes": [
+            {
+                "id": change.id if isinstance(change, models.Contact) else change.contact_id,
+                "revision": change.revision,
+                "deleted": not isinstance(change, models.Contact),
+                "contact": change if isinstance(change, models.Contact) else None,
+            }
+            for change in changes
+        ],
+        "cursor": encode_cursor(changes[-1].revision if changes else since_revision, kind="rev"),
+        "has_more": has_more,
+    }
+
+@router.get("/contacts/events")
+@query_budget(1)
+@streaming
+async def contact_events(current_user: schemas.User = Depends(get_stream_user)):
+    """
+    Потік змін контактів поточного користувача (server-sent events).
+
+    Події ``created``, ``updated`` і ``deleted`` містять зміну у форматі
+    ``GET /contacts/changes``, а ``id`` події - курсор ``since`` для нього.
+    Щоб нічого не пропустити, клієнт спершу підписується, а потім читає
+    ``/contacts/changes``; після перепідключення - з ``since``, рівним
+    ``Last-Event-ID``. Подія ``resync`` (масовий імпорт або переповнена черга
+    клієнта) означає, що зміни треба перечитати тим самим способом.
+
+    Параметри:
+        current_user (schemas.User): Залогінений користувач.
+
+    Повертає:
+        StreamingResponse: Потік ``text/event-stream``.
+    """
+    subscription = events.hub.subscribe(current_user.id)
+    return StreamingResponse(
+        events.hub.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/contacts/by-phone/{number}", response_model=List[schemas.Contact])
+@query_budget(2)
+@response_cache.cached(List[schemas.Contact], owner="current_user")
+async def find_contacts_by_phone(request: Request, number: str, match: str = Query("exact", pattern="^(exact|prefix|suffix)$"),
+                                 limit: int = Query(10, ge=1, le=100),
+                                 current_user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_read_session)):
+    """
+    Знаходить контакти поточного користувача за номером телефону.
+
+    Номер порівнюється лише за цифрами (``+38 (050) 123-45-67`` і
+    ``380501234567`` однакові) через індекс ``(owner_id, phone_digits)``.
+    ``match=prefix`` шукає номери, що починаються з ``number``, а
+    ``match=suffix`` - ті, що ним закінчуються (наприклад, номер без коду
+    країни); обидва режими читають діапазон індексу.
+
+    Параметри:
+        request (Request): Запит (потрібен для кешу відповідей).
+        number (str): Номер телефону в довільному форматі.
+        match (str): ``exact``, ``prefix`` або ``suffix``.
+        limit (int): Максимальна кількість контактів для ``prefix``/``suffix``.
+        current_user (schemas.User): Залогінений користувач.
+        db (Session): Сесія бази даних.
+
+    Повертає:
+        List[schemas.Contact]: Знайдені контакти (для ``exact`` - не більше одного).
+
+    Викликає:
+        HTTPException: 422, якщо в номері немає цифр.
+    """
+    digits = models.phone_digits(number)
+    if digits is None:
+        raise HTTPException(status_code=422, detail="Phone number must contain digits")
+    return await async_crud.find_contacts_by_phone(db, current_user.id, digits, match, limit)
+
 @router.get("/contacts/{contact_id}", response_model=schemas.Contact)
-def read_contact(contact_id: int, current_user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    contact = crud.get_contact(db, contact_id)
+@query_budget(2)
+@response_cache.cached(schemas.Contact, owner="current_user")
+async def read_contact(request: Request, contact_id: int, current_user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_session)):
+    contact = await async_crud.get_contact(db, contact_id)
     if contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
     
@@ -132,69 +326,113 @@ def read_contact(contact_id: int, current_user: schemas.User = Depends(get_curre
     return contact
 
 @router.put("/contacts/{contact_id}", response_model=schemas.Contact)
-def update_contact(contact_id: int, contact: schemas.ContactCreate, db: Session = Depends(get_db)):
-    updated_contact = crud.update_contact(db, contact_id, contact)
+@query_budget(4)
+async def update_contact(request: Request, response: Response, contact_id: int, contact: schemas.ContactCreate,
+                         current_user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_session)):
+    # Чужий контакт не відрізняється від відсутнього.
+    updated_contact = await async_crud.update_contact(db, contact_id, contact, current_user.id)
     if updated_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
+    replicas.pin_to_primary(request, response)
     return updated_contact
 
 @router.delete("/contacts/{contact_id}", response_model=schemas.Contact)
-def delete_contact(contact_id: int, current_user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    contact = crud.get_contact(db, contact_id)
+@query_budget(5)
+async def delete_contact(request: Request, response: Response, contact_id: int, current_user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_session)):
+    contact = await async_crud.get_contact(db, contact_id)
     if contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
 
     if contact.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    deleted_contact = crud.delete_contact(db, contact_id)
+    deleted_contact = await async_crud.delete_contact(db, contact_id)
     if deleted_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
-    
+    replicas.pin_to_primary(request, response)
     return deleted_contact
 
 @router.get("/contacts/search/", response_model=List[schemas.Contact])
-def search_contacts(query: str, db: Session = Depends(get_db)):
-    contacts = crud.search_contacts(db, query)
+@query_budget(2)
+@response_cache.cached(sparse_fields.list_response_model, owner="current_user")
+async def search_contacts(request: Request, query: str, skip: int = Query(0, alias="page", ge=0), limit: int = Query(20, ge=1, le=100),
+                    fields: sparse_fields.Projection = Depends(sparse_fields.contact_fields),
+                    current_user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_read_session)):
+    """
+    Шукає контакти поточного користувача за ім'ям, прізвищем, електронною поштою або телефоном.
+
+    Результати впорядковані за релевантністю та обмежені розміром сторінки.
+
+    Параметри:
+        request (Request): Запит (потрібен для кешу відповідей).
+        query (str): Рядок пошуку.
+        skip (int): Зсув для пагінації.
+        limit (int): Розмір сторінки.
+        fields (sparse_fields.Projection): Поля контакту з параметра ``fields``.
+        current_user (schemas.User): Залогінений користувач.
+        db (Session): Сесія бази даних.
+
+    Повертає:
+        List[schemas.Contact]: Знайдені контакти.
+    """
+    contacts = await async_crud.search_contacts(db, current_user.id, query, skip, limit, columns=fields.columns)
     return contacts
 
 @router.get("/contacts/birthdays/", response_model=List[schemas.Contact])
-def upcoming_birthdays(db: Session = Depends(get_db)):
-    contacts = crud.get_upcoming_birthdays(db)
+@query_budget(2)
+@response_cache.cached(List[schemas.Contact], owner="current_user")
+async def upcoming_birthdays(request: Request, days: int = Query(7, ge=0, le=366),
+                             current_user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_read_session)):
+    """
+    Повертає контакти поточного користувача, у яких день народження протягом
+    найближчих ``days`` днів.
+
+    Параметри:
+        request (Request): Запит (потрібен для кешу відповідей).
+        days (int): Кількість днів, починаючи з сьогодні.
+        current_user (schemas.User): Залогінений користувач.
+        db (Session): Сесія бази даних.
+
+    Повертає:
+        List[schemas.Contact]: Контакти, впорядковані за найближчим днем народження.
+    """
+    contacts = await async_crud.get_upcoming_birthdays(db, current_user.id, days)
     return contacts
 
 
 from fastapi import HTTPException
 
 @router.post("/register", response_model=schemas.User)
-async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db), background_tasks: BackgroundTasks = BackgroundTasks()):
+@query_budget(4)
+async def register_user(user: schemas.UserCreate, db: AnySession = Depends(get_session)):
     """
     Реєструє нового користувача в системі.
 
+    Лист підтвердження записується в чергу відправлення в тій самій транзакції,
+    що й користувач, і надсилається фоновим диспетчером ``outbox``.
+
     Параметри:
         user (schemas.UserCreate): Дані користувача для реєстрації.
         db (Session): Сесія бази даних.
-        background_tasks (BackgroundTasks): Об'єкт для виконання фонових завдань.
 
     Повертає:
         schemas.User: Зареєстрований користувач.
     """
-    existing_user = crud.get_user_by_email(db, user.email)
+    existing_user = await async_crud.get_user_by_email(db, user.email)
     if existing_user:
         raise HTTPException(status_code=409, detail="User with this email already exists")
 
-    new_user = crud.create_user(db, user)
-    users = crud.get_users(db)
-    users.append(new_user)
+    hashed_password = await get_password_hash_async(user.password)
+    new_user = await async_crud.create_user(db, user, hashed_password, confirmation_email(user.email))
+
+    outbox.dispatcher.wake()
 
-    confirmation_token = create_confirmation_token(user.email)
-    background_tasks.add_task(send_email_confirmation, user.email, confirmation_token, background_tasks)
-    
     return new_user
 
 
 @router.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@query_budget(1)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AnySession = Depends(get_session)):
     """
     Аутентифікує користувача та повертає токен доступу.
 
@@ -205,8 +443,8 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     Повертає:
         dict: Об'єкт з токеном доступу та типом токену.
     """
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password):
+    user = await async_crud.get_user_by_email(db, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.password):
         raise HTTPException(
             status_code=400,
             detail="Incorrect username or password",
@@ -220,39 +458,31 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/users/", response_model=List[schemas.User])
-def get_all_users(skip: int = Query(0), limit: int = Query(100), 
-                   db: Session = Depends(get_db)):
-    users = crud.get_users(db, skip, limit)
-    return users
+@query_budget(1)
+async def get_all_users(response: Response, skip: int = Query(0), limit: int = Query(100),
+                   after: Optional[str] = Query(None), db: AnySession = Depends(get_read_session)):
+    after_id = decode_cursor(after) if after else None
+    users = await async_crud.get_users(db, skip, limit, after_id=after_id)
+    set_next_cursor(response, users, limit)
+    return serialization.json_response(List[schemas.User], users, response)
 
 
 
 @router.post("/send-confirmation-email/", response_model=dict)
-async def send_confirmation_email(email: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == email).first()
+@query_budget(3)
+async def send_confirmation_email(email: str, db: AnySession = Depends(get_session)):
+    user = await async_crud.get_user_by_email(db, email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    confirmation_token = create_confirmation_token(user.email)
-
-    confirm_url = f"http://127.0.0.1:8000/confirm?token={confirmation_token}"
-
-    try:
-        message = MessageSchema(
-            subject="Email Confirmation",
-            recipients=[email],
-            body=f"Click the following link to confirm your email: {confirm_url}",
-            subtype="html"
-        )
-        await fastmail.send_message(message)
-        return {"message": "Confirmation email sent successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to send confirmation email: {str(e)}")
-    
+    await async_crud.enqueue_email(db, confirmation_email(user.email))
+    outbox.dispatcher.wake()
+    return {"message": "Confirmation email queued"}
 
 
 @router.get("/confirm")
-async def confirm_email(token: str, db: Session = Depends(get_db)):
+@query_budget(3)
+async def confirm_email(token: str, db: AnySession = Depends(get_session)):
     try:
         decoded_token = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
@@ -262,33 +492,30 @@ async def confirm_email(token: str, db: Session = Depends(get_db)):
 
     email = decoded_token.get("sub")
 
-    user = crud.get_user_by_email(db, email)
+    user = await async_crud.verify_user(db, email)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.is_verified = True
-    db.commit()
-
     return {"message": "Email successfully confirmed"}
 
 
 @router.get("/verified-users/", response_model=List[schemas.User])
-def get_verified_users(skip: int = Query(0), limit: int = Query(100), 
-                       db: Session = Depends(get_db)):
-    users = crud.get_verified_users(db, skip, limit)
-    return users
+@query_budget(1)
+async def get_verified_users(response: Response, skip: int = Query(0), limit: int = Query(100),
+                       after: Optional[str] = Query(None), db: AnySession = Depends(get_read_session)):
+    after_id = decode_cursor(after) if after else None
+    users = await async_crud.get_verified_users(db, skip, limit, after_id=after_id)
+    set_next_cursor(response, users, limit)
+    return serialization.json_response(List[schemas.User], users, response)
 
 @router.post("/update-avatar/")
-async def update_avatar(file: UploadFile = File(...), user: schemas.User = Depends(get_current_user), db: Session = Depends(get_db)):
+@query_budget(6)
+async def update_avatar(file: UploadFile = File(...), user: schemas.User = Depends(get_current_user), db: AnySession = Depends(get_session)):
     if not file:
         raise HTTPException(status_code=400, detail="No image uploaded")
 
-    response = cloudinary.uploader.upload(file.file)
-
-    avatar_url = response["secure_url"]
-
-    user.avatar_url = avatar_url
-    db.commit()
+    avatar_url = await avatars.save_avatar(db, file)
+    await async_crud.update_user_avatar(db, user.id, avatar_url)
 
     return {"message": "Avatar updated successfully", "avatar_url": avatar_url}
 
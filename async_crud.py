@@ -0,0 +1,110 @@
+"""
+Асинхронні двійники функцій ``crud``.
+
+Кожна функція приймає або ``AsyncSession`` (режим ``DB_ASYNC``), або звичайну
+``Session``. Для ``AsyncSession`` запит із ``crud`` виконується через
+``run_sync`` поверх асинхронного драйвера (asyncpg, aiosqlite); для ``Session``
+він виконується в пулі потоків. В обох випадках цикл подій не блокується.
+"""
+from typing import List, Optional, Sequence, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import crud
+import schemas
+from metrics import CRUD_DURATION, timer
+
+AnySession = Union[AsyncSession, Session]
+
+
+async def _run(db: AnySession, fn, *args, **kwargs):
+    with timer(CRUD_DURATION, fn.__name__):
+        if isinstance(db, AsyncSession):
+            return await db.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def create_contact(db: AnySession, contact: schemas.ContactCreate, user_id: int):
+    return await _run(db, crud.create_contact, contact, user_id)
+
+
+async def bulk_create_contacts(db: AnySession, contacts: List[schemas.ContactCreate], user_id: int) -> List[str]:
+    return await _run(db, crud.bulk_create_contacts, contacts, user_id)
+
+
+async def get_contacts(db: AnySession, owner_id: int, skip: int = 0, limit: int = 10, after_id: Optional[int] = None,
+                       columns: Optional[Sequence[str]] = None):
+    return await _run(db, crud.get_contacts, owner_id, skip, limit, after_id=after_id, columns=columns)
+
+
+async def get_contact(db: AnySession, contact_id: int):
+    return await _run(db, crud.get_contact, contact_id)
+
+
+async def get_contacts_by_ids(db: AnySession, owner_id: int, contact_ids: List[int],
+                              columns: Optional[Sequence[str]] = None):
+    return await _run(db, crud.get_contacts_by_ids, owner_id, contact_ids, columns=columns)
+
+
+async def find_contacts_by_phone(db: AnySession, owner_id: int, phone_digits: str, match: str = "exact", limit: int = 10):
+    return await _run(db, crud.find_contacts_by_phone, owner_id, phone_digits, match, limit)
+
+
+async def get_contact_changes(db: AnySession, owner_id: int, since: int, limit: int = 100) -> list:
+    return await _run(db, crud.get_contact_changes, owner_id, since, limit)
+
+
+async def update_contact(db: AnySession, contact_id: int, contact: schemas.ContactCreate, owner_id: int):
+    return await _run(db, crud.update_contact, contact_id, contact, owner_id)
+
+
+async def delete_contact(db: AnySession, contact_id: int):
+    return await _run(db, crud.delete_contact, contact_id)
+
+
+async def search_contacts(db: AnySession, owner_id: int, query: str, skip: int = 0, limit: int = 20,
+                          columns: Optional[Sequence[str]] = None):
+    return await _run(db, crud.search_contacts, owner_id, query, skip, limit, columns=columns)
+
+
+async def get_upcoming_birthdays(db: AnySession, owner_id: int, days: int = 7):
+    return await _run(db, crud.get_upcoming_birthdays, owner_id, days)
+
+
+async def create_user(db: AnySession, user: schemas.UserCreate, hashed_password: Optional[str] = None,
+                      outbox_message: Optional[schemas.EmailMessage] = None):
+    return await _run(db, crud.create_user, user, hashed_password, outbox_message)
+
+
+async def get_user_by_email(db: AnySession, email: str):
+    return await _run(db, crud.get_user_by_email, email)
+
+
+async def verify_user(db: AnySession, email: str):
+    return await _run(db, crud.verify_user, email)
+
+
+async def update_user_avatar(db: AnySession, user_id: int, avatar_url: str):
+    return await _run(db, crud.update_user_avatar, user_id, avatar_url)
+
+
+async def get_avatar(db: AnySession, content_hash: str):
+    return await _run(db, crud.get_avatar, content_hash)
+
+
+async def save_avatar(db: AnySession, content_hash: str, url: str):
+    return await _run(db, crud.save_avatar, content_hash, url)
+
+
+async def get_users(db: AnySession, skip: int = 0, limit: int = 10, after_id: Optional[int] = None):
+    return await _run(db, crud.get_users, skip, limit, after_id=after_id)
+
+
+async def get_verified_users(db: AnySession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    return await _run(db, crud.get_verified_users, skip, limit, after_id=after_id)
+
+
+async def enqueue_email(db: AnySession, message: schemas.EmailMessage):
+    return await _run(db, crud.enqueue_email, message)
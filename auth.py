@@ -3,26 +3,70 @@ from database import get_db
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
 from typing import Optional
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import User, Contact
 from decouple import config
+from cache import TTLCache
+from metrics import DEPENDENCY_DURATION, timed, timer
+from passwords import PasswordHasher, PasswordHasherBusy, get_password_hash, password_hash, verify_password
+import schemas
 
 SECRET_KEY = config('SECRET_KEY')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+PASSWORD_HASH_QUEUE_SIZE = config('PASSWORD_HASH_QUEUE_SIZE', default=32, cast=int)
+PASSWORD_HASH_TIMEOUT = config('PASSWORD_HASH_TIMEOUT', default=5, cast=float)
+PASSWORD_HASH_EXECUTOR = config('PASSWORD_HASH_EXECUTOR', default="thread")
+
+USER_CACHE_SIZE = config('USER_CACHE_SIZE', default=10000, cast=int)
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=60, cast=float)
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    queue_size=PASSWORD_HASH_QUEUE_SIZE,
+    timeout=PASSWORD_HASH_TIMEOUT,
+    kind=PASSWORD_HASH_EXECUTOR,
+)
+
+password_hasher_busy = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many authentication requests, try again later",
+    headers={"Retry-After": "1"},
+)
 
 
-def verify_password(plain_password, hashed_password):
-    return password_hash.verify(plain_password, hashed_password)
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Перевіряє пароль у пулі ``password_hasher``, не блокуючи цикл подій.
 
-def get_password_hash(password):
-    return password_hash.hash(password)
+    Викликає:
+        HTTPException: 503, якщо пул переповнений.
+    """
+    try:
+        with timer(DEPENDENCY_DURATION, "password_verify"):
+            return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Хешує пароль у пулі ``password_hasher``, не блокуючи цикл подій.
+
+    Викликає:
+        HTTPException: 503, якщо пул переповнений.
+    """
+    try:
+        with timer(DEPENDENCY_DURATION, "password_hash"):
+            return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -34,6 +78,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@timed(DEPENDENCY_DURATION, "get_current_user")
 def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -47,14 +92,38 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             raise credentials_exception
     except jwt.ExpiredSignatureError:
         raise credentials_exception
-    except jwt.JWTError:
+    except jwt.PyJWTError:
         raise credentials_exception
-    
+
+    cached_user = user_cache.get(username)
+    if cached_user is not None:
+        return cached_user
+
     user = db.query(User).filter(User.email == username).first()
     if user is None:
         raise credentials_exception
-    
-    return user
+
+    current_user = schemas.User.model_validate(user)
+    user_cache.set(username, current_user, expires_at=payload.get("exp"))
+    return current_user
+
+
+def get_stream_user(token: str = Depends(oauth2_scheme)):
+    """
+    ``get_current_user`` з власною короткою сесією замість залежності ``get_db``.
+
+    Для потокових відповідей: сесія залежності з ``yield`` закривається лише
+    після відповіді, тож тримала б з'єднання з пулу весь час потоку.
+    """
+    with SessionLocal() as db:
+        return get_current_user(db, token)
+
+
+def invalidate_cached_user(email: str):
+    """
+    Видаляє користувача з кешу ``get_current_user`` після зміни його даних.
+    """
+    user_cache.invalidate(email)
 
 
 
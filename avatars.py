@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+from decouple import config
+from fastapi import HTTPException, UploadFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+import async_crud
+from async_crud import AnySession
+from metrics import DEPENDENCY_DURATION, timed
+
+AVATAR_SIZE = config('AVATAR_SIZE', default=256, cast=int)
+AVATAR_MAX_BYTES = config('AVATAR_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+AVATAR_RESIZE_WORKERS = config('AVATAR_RESIZE_WORKERS', default=2, cast=int)
+AVATAR_UPLOAD_CONCURRENCY = config('AVATAR_UPLOAD_CONCURRENCY', default=4, cast=int)
+AVATAR_STORAGE = config('AVATAR_STORAGE', default="cloudinary")
+AVATAR_LOCAL_DIR = config('AVATAR_LOCAL_DIR', default="avatars")
+AVATAR_LOCAL_URL = config('AVATAR_LOCAL_URL', default="/avatars")
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_resize_executor = ThreadPoolExecutor(max_workers=AVATAR_RESIZE_WORKERS, thread_name_prefix="avatar-resize")
+_upload_executor = ThreadPoolExecutor(max_workers=AVATAR_UPLOAD_CONCURRENCY, thread_name_prefix="avatar-upload")
+
+
+class CloudinaryStorage:
+    """
+    Зберігає аватари в Cloudinary під ідентифікатором ``avatars/<хеш>``.
+
+    Клієнт Cloudinary імпортується й налаштовується під час першого
+    завантаження, а не під час запуску воркера.
+    """
+
+    def __init__(self):
+        self._uploader = None
+        self._lock = threading.Lock()
+
+    def _get_uploader(self):
+        with self._lock:
+            if self._uploader is None:
+                import cloudinary
+                import cloudinary.uploader
+
+                cloudinary.config(
+                    cloud_name=config('CLOUDINARY_CLOUD_NAME'),
+                    api_key=config('CLOUDINARY_API_KEY'),
+                    api_secret=config('CLOUDINARY_API_SECRET'),
+                )
+                self._uploader = cloudinary.uploader
+            return self._uploader
+
+    @timed(DEPENDENCY_DURATION, "cloudinary_upload")
+    def save(self, key: str, data: bytes) -> str:
+        response = self._get_uploader().upload(data, public_id=f"avatars/{key}", overwrite=False, resource_type="image")
+        return response["secure_url"]
+
+
+class LocalStorage:
+    """
+    Зберігає аватари у локальній теці; використовується для розробки та тестів.
+
+    Параметри:
+        directory (str): Тека, у яку записуються файли.
+        base_url (str): Префікс URL, під яким тека доступна клієнтам.
+    """
+
+    def __init__(self, directory: str, base_url: str):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+
+    def save(self, key: str, data: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{key}.webp")
+        if not os.path.exists(path):
+            with open(path + ".tmp", "wb") as avatar_file:
+                avatar_file.write(data)
+            os.replace(path + ".tmp", path)
+        return f"{self.base_url}/{key}.webp"
+
+
+STORAGES = {
+    "cloudinary": CloudinaryStorage,
+    "local": lambda: LocalStorage(AVATAR_LOCAL_DIR, AVATAR_LOCAL_URL),
+}
+
+storage = STORAGES[AVATAR_STORAGE]()
+
+
+def resize_avatar(data: bytes, size: int = AVATAR_SIZE) -> bytes:
+    """
+    Декодує зображення, обрізає його до квадрата і зменшує до ``size`` пікселів.
+
+    Параметри:
+        data (bytes): Вміст завантаженого файлу.
+        size (int): Сторона квадратного аватара в пікселях.
+
+    Повертає:
+        bytes: Аватар у форматі WebP.
+
+    Викликає:
+        HTTPException: 400, якщо файл не є зображенням або має завелику роздільність.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("RGB", (size, size))
+            image = ImageOps.exif_transpose(image)
+            avatar = ImageOps.fit(image.convert("RGBA"), (size, size), Image.LANCZOS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise HTTPException(status_code=400, detail="Invalid image")
+    output = io.BytesIO()
+    avatar.save(output, format="WEBP", quality=85)
+    return output.getvalue()
+
+
+async def read_upload(file: UploadFile) -> Tuple[bytes, str]:
+    """
+    Читає завантажений файл частинами, рахуючи SHA-256 вмісту.
+
+    Повертає:
+        Tuple[bytes, str]: Вміст файлу та його хеш.
+
+    Викликає:
+        HTTPException: 413, якщо файл більший за ``AVATAR_MAX_BYTES``.
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while chunk := await file.read(READ_CHUNK_SIZE):
+        digest.update(chunk)
+        buffer.extend(chunk)
+        if len(buffer) > AVATAR_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Image is too large")
+    return bytes(buffer), digest.hexdigest()
+
+
+async def save_avatar(db: AnySession, file: UploadFile) -> str:
+    """
+    Повертає URL аватара для завантаженого файлу.
+
+    Якщо такий самий файл уже завантажувався, URL береться з таблиці
+    ``avatars`` без зменшення і без звернення до сховища. Інакше зображення
+    зменшується в пулі ``_resize_executor`` і завантажується в сховище в
+    пулі ``_upload_executor``, розмір якого обмежує кількість одночасних
+    завантажень.
+
+    Параметри:
+        db (Session): Сесія бази даних.
+        file (UploadFile): Завантажений файл.
+
+    Повертає:
+        str: URL аватара.
+    """
+    data, content_hash = await read_upload(file)
+    if not data:
+        raise HTTPException(status_code=400, detail="No image uploaded")
+
+    existing = await async_crud.get_avatar(db, content_hash)
+    if existing is not None:
+        return existing.url
+
+    loop = asyncio.get_running_loop()
+    avatar = await loop.run_in_executor(_resize_executor, resize_avatar, data)
+    url = await loop.run_in_executor(_upload_executor, storage.save, content_hash, avatar)
+    await async_crud.save_avatar(db, content_hash, url)
+    return url
@@ -0,0 +1,83 @@
+"""
+Порівняння пропускної здатності синхронного та асинхронного (``DB_ASYNC``)
+доступу до бази при конкурентних запитах.
+
+Кожен режим запускається в окремому процесі, бо режим обирається під час
+імпорту ``database``. Запити йдуть у застосунок ``main.app`` напряму через
+ASGI-транспорт httpx.
+
+Запуск:
+    python benchmarks/bench_async.py --rows 100000 --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import OWNER_EMAIL, percentile, seed_contacts
+
+PATHS = ["/contacts/search/?query=Shevchenko&limit=20", "/contacts/birthdays/?days=7", "/users/?limit=20"]
+
+
+async def drive(concurrency: int, total: int) -> dict:
+    import httpx
+    from auth import create_access_token
+    from main import app
+
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(PATHS[i % len(PATHS)])
+
+    async def worker(client):
+        while not queue.empty():
+            path = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': OWNER_EMAIL})}"}
+    async with httpx.AsyncClient(app=app, base_url="http://bench", headers=headers) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "rps": total / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(drive(args.concurrency, args.requests))))
+        return
+
+    seed_contacts(args.rows)
+    print(f"{'mode':>6} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for mode in ("false", "true"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", "--concurrency", str(args.concurrency), "--requests", str(args.requests)],
+            env={**os.environ, "DB_ASYNC": mode},
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        label = "async" if mode == "true" else "sync"
+        print(f"{label:>6} {result['rps']:>10.1f} {result['p50']:>10.2f} {result['p95']:>10.2f} {result['p99']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Порівняння пікової пам'яті та часу до першого байта для потокового
+експорту (``export.iter_export``) і матеріалізації всього списку через
+``.all()`` та Pydantic, як це роблять списочні ендпоінти.
+
+Запуск:
+    python benchmarks/bench_export.py --rows 1000000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from common import SessionLocal, models, seed_contacts
+
+import export
+import schemas
+
+
+def materialized(owner_id: int):
+    with SessionLocal() as db:
+        contacts = db.query(models.Contact).filter(models.Contact.owner_id == owner_id).order_by(models.Contact.id).all()
+        payload = [schemas.Contact.model_validate(contact, from_attributes=True).model_dump(mode="json") for contact in contacts]
+    yield json.dumps(payload).encode()
+
+
+def measure(chunks) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_byte = None
+    total = 0
+    for chunk in chunks:
+        if chunk and first_byte is None:
+            first_byte = time.perf_counter() - start
+        total += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte * 1000, elapsed * 1000, peak / 2 ** 20, total / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    owner_id = seed_contacts(args.rows)
+    variants = [
+        ("stream csv", lambda: export.iter_export(owner_id, "csv")),
+        ("stream ndjson", lambda: export.iter_export(owner_id, "ndjson")),
+        ("materialized json", lambda: materialized(owner_id)),
+    ]
+
+    print(f"{'variant':>18} {'ttfb ms':>10} {'total ms':>10} {'peak MiB':>10} {'out MiB':>10}")
+    for name, chunks in variants:
+        ttfb, elapsed, peak, size = measure(chunks())
+        print(f"{name:>18} {ttfb:>10.1f} {elapsed:>10.1f} {peak:>10.1f} {size:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Навантажувальний бенчмарк API: застосунок ``main.app`` викликається напряму
+через ASGI-транспорт httpx на заповненій базі (SQLite за замовчуванням або
+Postgres через ``DATABASE_URL``).
+
+Кожен маршрут проганяється окремою фазою з ``--concurrency`` одночасними
+клієнтами; для кожного виводяться req/s та p50/p95/p99. Результати можна
+зберегти як базові (``--save-baseline``) і порівнювати з ними наступні
+запуски: маршрут, у якого req/s впали або p95 зросли більше ніж на
+``--tolerance``, позначається як регресія, а процес завершується з кодом 1.
+
+Запуск:
+    python benchmarks/bench_load.py --rows 100000 --concurrency 20 --requests 500 --save-baseline
+    python benchmarks/bench_load.py --rows 100000 --concurrency 20 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from common import LAST_NAMES, OWNER_EMAIL, percentile, seed_contacts
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+PASSWORD = "load-password"
+
+
+class Route(NamedTuple):
+    name: str
+    build: Callable[[dict, int], Tuple[str, str, dict]]
+    collect: Optional[Callable[[dict, object], None]] = None
+    needs_contacts: bool = False
+
+
+def contact_json(ctx: dict, i: int, prefix: str = "new") -> dict:
+    return {
+        "first_name": f"Load{i}",
+        "last_name": prefix.title(),
+        "email": f"load-{ctx['run']}-{prefix}-{i}@contacts.example.com",
+        "phone_number": f"380{i:09d}",
+        "birth_date": f"19{70 + i % 30}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+    }
+
+
+def contact_id(ctx: dict, i: int) -> int:
+    return ctx["contact_ids"][i % len(ctx["contact_ids"])]
+
+
+ROUTES = [
+    Route("auth.register", lambda ctx, i: ("POST", "/register", {
+        "json": {"email": f"load-{ctx['run']}-{i}@users.example.com", "password": PASSWORD}})),
+    Route("auth.token", lambda ctx, i: ("POST", "/token", {
+        "data": {"username": ctx["email"], "password": PASSWORD}})),
+    Route("contacts.create", lambda ctx, i: ("POST", "/contacts/", {
+        "json": contact_json(ctx, i), "headers": ctx["headers"]}),
+        collect=lambda ctx, response: ctx["contact_ids"].append(response.json()["id"])),
+    Route("contacts.read", lambda ctx, i: ("GET", f"/contacts/{contact_id(ctx, i)}", {"headers": ctx["headers"]}),
+          needs_contacts=True),
+    Route("contacts.batch", lambda ctx, i: ("GET", "/contacts/batch?ids=" + ",".join(
+        str(contact_id(ctx, i + offset)) for offset in range(50)), {"headers": ctx["headers"]}), needs_contacts=True),
+    Route("contacts.update", lambda ctx, i: ("PUT", f"/contacts/{contact_id(ctx, i)}", {
+        "json": contact_json(ctx, contact_id(ctx, i), "updated"), "headers": ctx["headers"]}), needs_contacts=True),
+    Route("contacts.list", lambda ctx, i: ("GET", f"/contacts/?limit=20&page={i % 100 * 20}", {"headers": ctx["owner_headers"]})),
+    Route("contacts.list.fields", lambda ctx, i: ("GET", f"/contacts/?limit=20&page={i % 100 * 20}&fields=first_name,last_name",
+                                                  {"headers": ctx["owner_headers"]})),
+    Route("contacts.search", lambda ctx, i: ("GET", f"/contacts/search/?query={LAST_NAMES[i % len(LAST_NAMES)]}",
+                                             {"headers": ctx["owner_headers"]})),
+    Route("contacts.by_phone", lambda ctx, i: ("GET", f"/contacts/by-phone/+380%20{i % 1000:09d}",
+                                              {"headers": ctx["owner_headers"]})),
+    Route("contacts.by_phone.suffix", lambda ctx, i: ("GET", f"/contacts/by-phone/{i % 1000:07d}?match=suffix",
+                                                     {"headers": ctx["owner_headers"]})),
+    Route("contacts.birthdays", lambda ctx, i: ("GET", f"/contacts/birthdays/?days={7 + i % 24}", {"headers": ctx["owner_headers"]})),
+    Route("users.list", lambda ctx, i: ("GET", "/users/?limit=20", {})),
+    Route("users.verified", lambda ctx, i: ("GET", "/verified-users/?limit=20", {})),
+    Route("contacts.delete", lambda ctx, i: ("DELETE", f"/contacts/{ctx['contact_ids'][i]}", {"headers": ctx["headers"]}),
+          needs_contacts=True),
+]
+
+
+async def run_route(client, route: Route, ctx: dict, concurrency: int, total: int, warmup: int) -> dict:
+    if route.name == "contacts.delete":
+        total = min(total, len(ctx["contact_ids"]))
+    if route.build(ctx, 0)[0] == "GET":
+        async def warm(i):
+            _, url, kwargs = route.build(ctx, i)
+            await client.get(url, **kwargs)
+        await asyncio.gather(*(warm(i) for i in range(warmup)))
+    latencies: List[float] = []
+    errors: Dict[int, int] = {}
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            method, url, kwargs = route.build(ctx, i)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+            elif route.collect is not None:
+                route.collect(ctx, response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50) if latencies else 0.0,
+        "p95": percentile(latencies, 0.95) if latencies else 0.0,
+        "p99": percentile(latencies, 0.99) if latencies else 0.0,
+    }
+
+
+async def drive(routes: List[Route], concurrency: int, total: int, warmup: int, response_cache: bool) -> Dict[str, dict]:
+    import httpx
+
+    import api
+    import response_cache as cache_module
+    from auth import create_access_token
+    from main import app
+
+    api.limiter.enabled = False
+    if not response_cache:
+        cache_module.response_cache.maxsize = 0
+
+    ctx = {"run": uuid.uuid4().hex[:8], "contact_ids": []}
+    ctx["email"] = f"load-{ctx['run']}@users.example.com"
+    results = {}
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        response = await client.post("/register", json={"email": ctx["email"], "password": PASSWORD})
+        response.raise_for_status()
+        response = await client.post("/token", data={"username": ctx["email"], "password": PASSWORD})
+        ctx["headers"] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        # Читання списків ідуть від власника заповнених контактів.
+        ctx["owner_headers"] = {"Authorization": f"Bearer {create_access_token(data={'sub': OWNER_EMAIL})}"}
+        for route in routes:
+            if route.needs_contacts and not ctx["contact_ids"]:
+                print(f"Skipping {route.name}: run it together with contacts.create")
+                continue
+            results[route.name] = await run_route(client, route, ctx, concurrency, total, warmup)
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    Виводить зміну req/s і p95 відносно базових результатів і повертає
+    назви маршрутів з регресією.
+    """
+    regressions = []
+    print(f"\n{'route':>20} {'req/s':>10} {'base':>10} {'change':>8} {'p95 ms':>10} {'base':>10} {'change':>8}  status")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:>20} {result['rps']:>10.1f} {'-':>10} {'-':>8} {result['p95']:>10.2f} {'-':>10} {'-':>8}  new")
+            continue
+        rps_change = result["rps"] / base["rps"] - 1 if base["rps"] else 0.0
+        p95_change = result["p95"] / base["p95"] - 1 if base["p95"] else 0.0
+        regressed = rps_change < -tolerance or p95_change > tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:>20} {result['rps']:>10.1f} {base['rps']:>10.1f} {rps_change:>+8.1%} "
+              f"{result['p95']:>10.2f} {base['p95']:>10.2f} {p95_change:>+8.1%}  {'REGRESSION' if regressed else 'ok'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="кількість контактів у базі")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500, help="кількість запитів на маршрут")
+    parser.add_argument("--warmup", type=int, default=50, help="непораховані запити перед читанням")
+    parser.add_argument("--routes", help="маршрути через кому: " + ",".join(route.name for route in ROUTES))
+    parser.add_argument("--no-response-cache", action="store_true", help="вимкнути кеш відповідей")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустиме погіршення, частка")
+    parser.add_argument("--output", help="зберегти результати в JSON")
+    args = parser.parse_args()
+
+    routes = ROUTES
+    if args.routes:
+        selected = set(args.routes.split(","))
+        routes = [route for route in ROUTES if route.name in selected]
+
+    seed_contacts(args.rows)
+    results = asyncio.run(drive(routes, args.concurrency, args.requests, args.warmup, not args.no_response_cache))
+
+    print(f"{'route':>20} {'requests':>9} {'errors':>8} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, result in results.items():
+        errors = sum(result["errors"].values())
+        print(f"{name:>20} {result['requests']:>9} {errors:>8} {result['rps']:>10.1f} "
+              f"{result['p50']:>10.2f} {result['p95']:>10.2f} {result['p99']:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline:
+            json.dump(results, baseline, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
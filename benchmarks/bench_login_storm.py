@@ -0,0 +1,103 @@
+"""
+Навантажувальний тест: затримка незахищеного маршруту ``GET /`` під час
+шквалу запитів ``POST /token``.
+
+Для кожного виду пулу хешування (``PASSWORD_HASH_EXECUTOR``) вимірюється
+затримка ``GET /`` без навантаження та під час одночасних входів. Якщо
+хешування не блокує цикл подій, обидва значення майже однакові.
+
+Запуск:
+    python benchmarks/bench_login_storm.py --logins 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import SessionLocal, percentile, seed_contacts
+
+STORM_EMAIL = "storm@example.com"
+STORM_PASSWORD = "storm-password"
+
+
+def seed_user():
+    import crud
+    import models
+
+    seed_contacts(0)
+    with SessionLocal() as db:
+        if crud.get_user_by_email(db, STORM_EMAIL) is None:
+            crud.create_user(db, models.User(email=STORM_EMAIL, password=STORM_PASSWORD))
+
+
+async def probe(client, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def drive(logins: int, concurrency: int) -> dict:
+    import httpx
+    from main import app
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        idle, stop = [], asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, idle))
+        await asyncio.sleep(1)
+        stop.set()
+        await task
+
+        storm, stop = [], asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, storm))
+        remaining = iter(range(logins))
+        statuses = {}
+
+        async def login_worker():
+            for _ in remaining:
+                response = await client.post("/token", data={"username": STORM_EMAIL, "password": STORM_PASSWORD})
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await task
+
+    return {
+        "idle_p50": percentile(idle, 0.5), "idle_p99": percentile(idle, 0.99),
+        "storm_p50": percentile(storm, 0.5), "storm_p99": percentile(storm, 0.99),
+        "logins_per_s": logins / elapsed, "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(drive(args.logins, args.concurrency))))
+        return
+
+    seed_user()
+    print(f"{'executor':>9} {'idle p50':>9} {'idle p99':>9} {'storm p50':>10} {'storm p99':>10} {'logins/s':>9}  statuses")
+    for kind in ("thread", "process"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", "--logins", str(args.logins), "--concurrency", str(args.concurrency)],
+            env={**os.environ, "PASSWORD_HASH_EXECUTOR": kind},
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{kind:>9} {r['idle_p50']:>9.2f} {r['idle_p99']:>9.2f} {r['storm_p50']:>10.2f} "
+              f"{r['storm_p99']:>10.2f} {r['logins_per_s']:>9.1f}  {r['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
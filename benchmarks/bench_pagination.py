@@ -0,0 +1,37 @@
+"""
+Порівняння пагінації зі зсувом (``page``) та keyset-пагінації (``after``)
+для ``crud.get_contacts`` на таблиці з великою кількістю контактів.
+
+Запуск:
+    python benchmarks/bench_pagination.py --rows 1000000 --limit 10
+"""
+import argparse
+
+from common import SessionLocal, best_of, models, seed_contacts
+
+import crud
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    owner_id = seed_contacts(args.rows)
+    depths = [0, args.rows // 100, args.rows // 10, args.rows // 2, args.rows - args.limit]
+
+    print(f"{'depth':>10} {'offset ms':>12} {'keyset ms':>12}")
+    with SessionLocal() as db:
+        ids = [row[0] for row in db.query(models.Contact.id).filter(models.Contact.owner_id == owner_id)
+               .order_by(models.Contact.id).all()]
+        for depth in depths:
+            after_id = ids[depth - 1] if depth else 0
+            offset_ms = best_of(lambda: crud.get_contacts(db, owner_id, depth, args.limit), args.repeat)
+            keyset_ms = best_of(lambda: crud.get_contacts(db, owner_id, limit=args.limit, after_id=after_id), args.repeat)
+            print(f"{depth:>10} {offset_ms:>12.3f} {keyset_ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Порівняння індексованого пошуку ``crud.search_contacts`` із колишнім
+``ILIKE '%q%'`` по чотирьох колонках.
+
+Базовий запит повторює колишній ``crud.search_contacts`` без змін: без
+фільтра за власником, сортування і ``LIMIT``, тож він читає й повертає всі
+збіги; індексований пошук повертає сторінку з ``--limit`` контактів.
+Кількість повернених рядків виводиться поруч із часом.
+
+Запуск:
+    python benchmarks/bench_search.py --rows 1000000
+"""
+import argparse
+
+from common import SessionLocal, best_of, models, seed_contacts
+
+import crud
+
+
+QUERIES = ["Shevchenko", "Olena12", "contact99999@", "380000123", "nobody-matches"]
+
+
+def baseline_search(db, query: str):
+    """
+    Колишній ``crud.search_contacts``.
+    """
+    return db.query(models.Contact).filter(
+        (models.Contact.first_name.ilike(f"%{query}%")) |
+        (models.Contact.last_name.ilike(f"%{query}%")) |
+        (models.Contact.email.ilike(f"%{query}%")) |
+        (models.Contact.phone_number.ilike(f"%{query}%"))
+    ).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    owner_id = seed_contacts(args.rows)
+
+    print(f"{'query':>16} {'ilike ms':>12} {'ilike rows':>11} {'indexed ms':>12} {'indexed rows':>13}")
+    with SessionLocal() as db:
+        for term in QUERIES:
+            ilike_ms = best_of(lambda: baseline_search(db, term), args.repeat)
+            ilike_rows = len(baseline_search(db, term))
+            indexed_ms = best_of(lambda: crud.search_contacts(db, owner_id, term, limit=args.limit), args.repeat)
+            indexed_rows = len(crud.search_contacts(db, owner_id, term, limit=args.limit))
+            print(f"{term:>16} {ilike_ms:>12.3f} {ilike_rows:>11} {indexed_ms:>12.3f} {indexed_rows:>13}")
+
+
+if __name__ == "__main__":
+    main()
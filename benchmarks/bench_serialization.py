@@ -0,0 +1,60 @@
+"""
+Вартість серіалізації 100 рядків у відповідь ``List[schemas.Contact]`` і
+``List[schemas.User]``: стандартний шлях FastAPI (``response_model``,
+``jsonable_encoder`` і модуль json) проти ``serialization.dump_json``
+(кешований ``TypeAdapter`` з ``from_attributes`` і orjson).
+
+Запуск:
+    python benchmarks/bench_serialization.py --rows 100
+"""
+import argparse
+import asyncio
+import json
+from datetime import date
+from typing import List
+
+from common import best_of, models
+
+from fastapi.dependencies.utils import create_response_field
+from fastapi.routing import serialize_response
+
+import schemas
+import serialization
+
+
+def fastapi_default(response_model, rows):
+    field = create_response_field(name="response", type_=response_model)
+    loop = asyncio.new_event_loop()
+
+    def run():
+        content = loop.run_until_complete(serialize_response(field=field, response_content=rows, is_coroutine=True))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    contacts = [
+        models.Contact(id=i, first_name=f"John{i}", last_name="Doe", email=f"contact{i}@example.com",
+                       phone_number=f"380{i:09d}", birth_date=date(1990, 1 + i % 12, 1 + i % 28), owner_id=1)
+        for i in range(args.rows)
+    ]
+    users = [models.User(id=i, email=f"user{i}@example.com", password="x") for i in range(args.rows)]
+
+    print(f"{'model':>10} {'fastapi us':>12} {'fast path us':>14} {'speedup':>8}")
+    for name, response_model, rows in (("Contact", List[schemas.Contact], contacts), ("User", List[schemas.User], users)):
+        default = fastapi_default(response_model, rows)
+        fast = lambda: serialization.dump_json(response_model, rows)
+        assert json.loads(default()) == json.loads(fast())
+        default_us = best_of(lambda: [default() for _ in range(args.number)], args.repeat) * 1000 / args.number
+        fast_us = best_of(lambda: [fast() for _ in range(args.number)], args.repeat) * 1000 / args.number
+        print(f"{name:>10} {default_us:>12.1f} {fast_us:>14.1f} {default_us / fast_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
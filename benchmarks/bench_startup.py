@@ -0,0 +1,77 @@
+"""
+Час холодного старту воркера: імпорт ``main``, запуск lifespan і перший
+запит до застосунку.
+
+Кожен повтор виконується в окремому процесі, бо після першого імпорту
+модулі вже завантажені; процес-воркер не імпортує ``common``, щоб не
+завантажувати SQLAlchemy і моделі до початку вимірювання. Схема бази
+створюється заздалегідь (``migrations.migrate``), як це робить крок
+розгортання.
+
+Запуск:
+    python benchmarks/bench_startup.py --repeat 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PHASES = ["import", "lifespan", "first_request"]
+
+
+async def measure() -> dict:
+    start = time.perf_counter()
+    import httpx
+    from main import app
+    imported = time.perf_counter()
+
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            response = await client.get("/users/?limit=20")
+            assert response.status_code == 200, response.text
+        answered = time.perf_counter()
+
+    return {
+        "import": (imported - start) * 1000,
+        "lifespan": (started - imported) * 1000,
+        "first_request": (answered - started) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(measure())))
+        return
+
+    from common import engine
+    import migrations
+
+    migrations.migrate(engine)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {phase: [] for phase in PHASES}
+    for _ in range(args.repeat):
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker"],
+            env={**os.environ, "PYTHONPATH": root}, check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        for phase in PHASES:
+            results[phase].append(result[phase])
+
+    print(f"{'phase':>14} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for phase, samples in results.items():
+        print(f"{phase:>14} {statistics.median(samples):>10.1f} {min(samples):>10.1f} {max(samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Спільні налаштування для бенчмарків: змінні оточення за замовчуванням,
+заповнення бази контактами та вимірювання часу.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "bench_contacts.db"))
+os.environ.setdefault("SECRET_KEY", "benchmark")
+for name in ("MAIL_USERNAME", "MAIL_PASSWORD", "CLOUDINARY_CLOUD_NAME", "CLOUDINARY_API_KEY", "CLOUDINARY_API_SECRET"):
+    os.environ.setdefault(name, "benchmark")
+os.environ.setdefault("MAIL_FROM", "benchmark@example.com")
+
+from sqlalchemy import func, insert  # noqa: E402
+
+import migrations  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+
+OWNER_EMAIL = "bench@example.com"
+
+FIRST_NAMES = ["John", "Jane", "Alice", "Bob", "Olena", "Taras", "Maria", "Ivan", "Sofia", "Petro"]
+LAST_NAMES = ["Doe", "Smith", "Johnson", "Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Melnyk"]
+
+
+def seed_contacts(rows: int, owner_email: str = OWNER_EMAIL) -> int:
+    """
+    Доповнює таблицю контактів до ``rows`` рядків і повертає id власника.
+    """
+    migrations.migrate(engine)
+    with SessionLocal() as db:
+        owner = db.query(models.User).filter(models.User.email == owner_email).first()
+        if owner is None:
+            owner = models.User(email=owner_email, password="x")
+            db.add(owner)
+            db.commit()
+        existing = db.query(func.count(models.Contact.id)).scalar()
+        batch = []
+        for i in range(existing, rows):
+            birth_date = date(1970 + i % 40, 1 + i % 12, 1 + i % 28)
+            phone_number = f"380{i:09d}"
+            batch.append({
+                "first_name": f"{FIRST_NAMES[i % len(FIRST_NAMES)]}{i}",
+                "last_name": LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)],
+                "email": f"contact{i}@example.com",
+                "phone_number": phone_number,
+                "phone_digits": phone_number,
+                "phone_digits_reversed": phone_number[::-1],
+                "birth_date": birth_date,
+                "birthday_key": models.birthday_key(birth_date),
+                "owner_id": owner.id,
+            })
+            if len(batch) == 10000:
+                db.execute(insert(models.Contact), batch)
+                batch = []
+        if batch:
+            db.execute(insert(models.Contact), batch)
+        db.commit()
+        return owner.id
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """
+    Повертає перцентиль ``fraction`` (0..1) відсортованої вибірки.
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def best_of(fn, repeat: int) -> float:
+    """
+    Повертає найкращий час виконання ``fn`` у мілісекундах.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
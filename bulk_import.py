@@ -0,0 +1,199 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from decouple import config
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+import async_crud
+import schemas
+from async_crud import AnySession
+
+BULK_CHUNK_SIZE = config('BULK_CHUNK_SIZE', default=1000, cast=int)
+BULK_MAX_REPORTED_ERRORS = config('BULK_MAX_REPORTED_ERRORS', default=1000, cast=int)
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonlines": "ndjson",
+}
+
+
+def detect_format(request: Request, requested: Optional[str] = None) -> str:
+    """
+    Визначає формат тіла запиту за параметром ``format`` або заголовком Content-Type.
+
+    Викликає:
+        HTTPException: 415, якщо формат не підтримується.
+    """
+    if requested:
+        if requested not in ("csv", "ndjson"):
+            raise HTTPException(status_code=415, detail="Unsupported format, use csv or ndjson")
+        return requested
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Unsupported content type, use text/csv or application/x-ndjson")
+    return CONTENT_TYPES[content_type]
+
+
+async def iter_lines(request: Request, quoted: bool) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Читає тіло запиту потоком і повертає логічні рядки з номером першого
+    фізичного рядка.
+
+    Якщо ``quoted``, рядок із незакритими лапками (CSV-значення з переносом
+    рядка) продовжується наступним фізичним рядком.
+
+    Викликає:
+        HTTPException: 400, якщо тіло запиту не в UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    physical = 0
+    logical, logical_start = None, 0
+
+    def decode(chunk: bytes, final: bool = False) -> str:
+        try:
+            return decoder.decode(chunk, final)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail=f"Request body is not valid UTF-8 (line {physical + 1})")
+
+    async def physical_lines():
+        nonlocal tail, physical
+        async for chunk in request.stream():
+            tail += decode(chunk)
+            *lines, tail = tail.split("\n")
+            for line in lines:
+                physical += 1
+                yield line
+        tail += decode(b"", final=True)
+        if tail:
+            physical += 1
+            yield tail
+
+    async for line in physical_lines():
+        line = line.rstrip("\r")
+        if logical is None:
+            logical, logical_start = line, physical
+        else:
+            logical += "\n" + line
+        if quoted and logical.count('"') % 2:
+            continue
+        yield logical_start, logical
+        logical = None
+    if logical is not None:
+        yield logical_start, logical
+
+
+async def iter_records(request: Request, data_format: str) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Повертає записи тіла запиту як ``(номер рядка, словник, помилка розбору)``.
+
+    Перший рядок CSV вважається заголовком з назвами полів ``schemas.ContactCreate``.
+    """
+    header = None
+    async for line_number, line in iter_lines(request, quoted=data_format == "csv"):
+        if not line.strip():
+            continue
+        if data_format == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                yield line_number, None, f"Invalid JSON: {error}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Expected a JSON object"
+                continue
+            yield line_number, record, None
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_number, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield line_number, dict(zip(header, values)), None
+
+
+class BulkImport:
+    """
+    Результат імпорту, що накопичується по частинах.
+
+    Зберігає лише лічильники та не більше ``BULK_MAX_REPORTED_ERRORS``
+    описів помилок, тому пам'ять не залежить від розміру файлу.
+    """
+
+    def __init__(self):
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors: List[schemas.BulkImportError] = []
+
+    def report(self, line: int, error: str, email: Optional[str] = None):
+        if len(self.errors) < BULK_MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.BulkImportError(line=line, email=email, error=error))
+
+    def result(self) -> schemas.BulkImportResult:
+        return schemas.BulkImportResult(
+            inserted=self.inserted,
+            duplicates=self.duplicates,
+            invalid=self.invalid,
+            errors=sorted(self.errors, key=lambda error: error.line),
+            errors_truncated=len(self.errors) < self.duplicates + self.invalid,
+        )
+
+
+async def _flush(db: AnySession, chunk: List[Tuple[int, schemas.ContactCreate]], user_id: int, progress: BulkImport):
+    inserted_emails = set(await async_crud.bulk_create_contacts(db, [contact for _, contact in chunk], user_id))
+    for line_number, contact in chunk:
+        if contact.email in inserted_emails:
+            inserted_emails.discard(contact.email)
+            progress.inserted += 1
+        else:
+            progress.duplicates += 1
+            progress.report(line_number, "Contact with this email or phone number already exists", contact.email)
+
+
+async def import_contacts(request: Request, data_format: str, db: AnySession, user_id: int) -> schemas.BulkImportResult:
+    """
+    Імпортує контакти з потокового тіла запиту частинами по ``BULK_CHUNK_SIZE``.
+
+    Кожна частина перевіряється через ``schemas.ContactCreate`` і вставляється
+    одним багаторядковим INSERT; контакти з уже наявною електронною поштою
+    або номером телефону пропускаються й потрапляють у звіт, не перериваючи
+    імпорт.
+
+    Параметри:
+        request (Request): Запит з тілом у форматі CSV або NDJSON.
+        data_format (str): ``"csv"`` або ``"ndjson"``.
+        db (Session): Сесія бази даних.
+        user_id (int): Власник імпортованих контактів.
+
+    Повертає:
+        schemas.BulkImportResult: Кількість вставлених, дубльованих і некоректних рядків.
+    """
+    progress = BulkImport()
+    chunk: List[Tuple[int, schemas.ContactCreate]] = []
+    async for line_number, record, parse_error in iter_records(request, data_format):
+        if parse_error is not None:
+            progress.invalid += 1
+            progress.report(line_number, parse_error)
+            continue
+        try:
+            chunk.append((line_number, schemas.ContactCreate(**record)))
+        except ValidationError as error:
+            progress.invalid += 1
+            progress.report(line_number, "; ".join(
+                f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+            ), record.get("email"))
+            continue
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await _flush(db, chunk, user_id, progress)
+            chunk = []
+    if chunk:
+        await _flush(db, chunk, user_id, progress)
+    return progress.result()
@@ -0,0 +1,4 @@
+import database
+import migrations
+
+migrations.migrate(database.engine)
@@ -1,10 +1,55 @@
+import sqlite3
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from auth import get_password_hash
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import List, Optional, Sequence
+from auth import get_password_hash, invalidate_cached_user
+from response_cache import invalidate_owner_responses
+from search import ranked_search
+import events
 import models
 import schemas
 
+DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+# Найбільша кількість параметрів одного запиту; SQLite до 3.32 дозволяє лише 999.
+MAX_BIND_PARAMETERS = {
+    "postgresql": 65535,
+    "sqlite": 32766 if sqlite3.sqlite_version_info >= (3, 32) else 999,
+}
+
+
+def _commit_contact(db: Session):
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Contact with this email or phone number already exists")
+
+
+def next_contact_revision(db: Session, owner_id: int, count: int = 1) -> int:
+    """
+    Резервує ``count`` ревізій контактів власника і повертає останню з них.
+
+    Лічильник зберігається в рядку користувача; ``UPDATE`` блокує цей рядок до
+    кінця транзакції, тож зміни контактів одного власника фіксуються в порядку
+    ревізій і стрічка змін не пропускає транзакцію, що завершилась пізніше.
+    """
+    statement = (
+        update(models.User)
+        .where(models.User.id == owner_id)
+        .values(contacts_revision=models.User.contacts_revision + count)
+        .returning(models.User.contacts_revision)
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(statement).scalar_one()
+
 
 def create_contact(db: Session, contact: schemas.ContactCreate, user_id: int):
     db_contact = models.Contact(
@@ -13,68 +58,167 @@ def create_contact(db: Session, contact: schemas.ContactCreate, user_id: int):
         email=contact.email,
         phone_number=contact.phone_number,
         birth_date=contact.birth_date,
-        owner_id=user_id
+        owner_id=user_id,
+        revision=next_contact_revision(db, user_id),
     )
     db.add(db_contact)
-    db.commit()
+    _commit_contact(db)
+    invalidate_owner_responses(user_id)
     db.refresh(db_contact)
+    events.publish_contact_change("created", user_id, db_contact.id, db_contact.revision, db_contact)
     return db_contact
 
 
 
-def get_contacts(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(models.Contact).offset(skip).limit(limit).all()
+def bulk_create_contacts(db: Session, contacts: List[schemas.ContactCreate], user_id: int) -> List[str]:
+    if not contacts:
+        return []
+    rows = []
+    first_revision = next_contact_revision(db, user_id, len(contacts)) - len(contacts) + 1
+    for revision, contact in enumerate(contacts, first_revision):
+        phone_digits = models.phone_digits(contact.phone_number)
+        rows.append({
+            **contact.model_dump(),
+            "birthday_key": models.birthday_key(contact.birth_date),
+            "phone_digits": phone_digits,
+            "phone_digits_reversed": phone_digits[::-1] if phone_digits else None,
+            "owner_id": user_id,
+            "revision": revision,
+        })
+    dialect = db.get_bind().dialect.name
+    insert = DIALECT_INSERTS[dialect]
+    batch_size = max(1, MAX_BIND_PARAMETERS[dialect] // len(rows[0]))
+    inserted_emails = []
+    for start in range(0, len(rows), batch_size):
+        # Без цільових колонок пропускаються конфлікти і за email, і за номером телефону власника.
+        statement = insert(models.Contact).values(rows[start:start + batch_size]).on_conflict_do_nothing()
+        inserted_emails += db.execute(statement.returning(models.Contact.email)).scalars().all()
+    db.commit()
+    if inserted_emails:
+        invalidate_owner_responses(user_id)
+        events.publish_resync(user_id)
+    return inserted_emails
+
+
+def contact_query(db: Session, columns: Optional[Sequence[str]] = None):
+    """
+    Запит контактів; з ``columns`` вибираються лише ці колонки, і результатом
+    будуть рядки замість ORM-об'єктів.
+    """
+    if columns is None:
+        return db.query(models.Contact)
+    return db.query(*(getattr(models.Contact, name) for name in columns))
+
+
+def get_contacts(db: Session, owner_id: int, skip: int = 0, limit: int = 10, after_id: Optional[int] = None,
+                 columns: Optional[Sequence[str]] = None):
+    query = contact_query(db, columns).filter(models.Contact.owner_id == owner_id)
+    if after_id is not None:
+        return query.filter(models.Contact.id > after_id).order_by(models.Contact.id).limit(limit).all()
+    return query.order_by(models.Contact.id).offset(skip).limit(limit).all()
 
 
 def get_contact(db: Session, contact_id: int):
-    return db.query(models.Contact).filter(models.Contact.id == contact_id).first()
+    return db.get(models.Contact, contact_id)
 
 
-def update_contact(db: Session, contact_id: int, contact: schemas.ContactCreate):
-    db_contact = db.query(models.Contact).filter(models.Contact.id == contact_id).first()
-    if db_contact:
-        contact_data = contact.model_dict
+def get_contacts_by_ids(db: Session, owner_id: int, contact_ids: List[int], columns: Optional[Sequence[str]] = None):
+    return contact_query(db, columns).filter(
+        models.Contact.owner_id == owner_id, models.Contact.id.in_(contact_ids)
+    ).order_by(models.Contact.id).all()
+
+
+def find_contacts_by_phone(db: Session, owner_id: int, phone_digits: str, match: str = "exact", limit: int = 10):
+    query = db.query(models.Contact).filter(models.Contact.owner_id == owner_id)
+    if match == "exact":
+        return query.filter(models.Contact.phone_digits == phone_digits).all()
+    if match == "prefix":
+        column, value = models.Contact.phone_digits, phone_digits
+    else:
+        column, value = models.Contact.phone_digits_reversed, phone_digits[::-1]
+    # Діапазон замість LIKE читає звичайний індекс; він точний лише за двійкової
+    # колації, тому в Postgres колонки мають COLLATE "C" (models.PhoneDigits).
+    # ":" - наступний після "9" символ.
+    return query.filter(column >= value, column < value + ":").order_by(column).limit(limit).all()
+
+
+def update_contact(db: Session, contact_id: int, contact: schemas.ContactCreate, owner_id: int):
+    db_contact = db.get(models.Contact, contact_id)
+    if db_contact and db_contact.owner_id == owner_id:
+        owner_id = db_contact.owner_id
+        contact_data = contact.model_dump()
         for key, value in contact_data.items():
             setattr(db_contact, key, value)
-        db.commit()
+        db_contact.revision = next_contact_revision(db, owner_id)
+        _commit_contact(db)
+        invalidate_owner_responses(owner_id)
         db.refresh(db_contact)
+        events.publish_contact_change("updated", owner_id, contact_id, db_contact.revision, db_contact)
         return db_contact
 
 
 def delete_contact(db: Session, contact_id: int):
-    db_contact = db.query(models.Contact).filter(models.Contact.id == contact_id).first()
+    db_contact = db.get(models.Contact, contact_id)
     if db_contact:
+        owner_id = db_contact.owner_id
+        revision = next_contact_revision(db, owner_id)
+        db.add(models.ContactTombstone(contact_id=contact_id, owner_id=owner_id, revision=revision))
         db.delete(db_contact)
         db.commit()
+        invalidate_owner_responses(owner_id)
+        events.publish_contact_change("deleted", owner_id, contact_id, revision)
         return db_contact
 
 
-def search_contacts(db: Session, query: str):
-    return db.query(models.Contact).filter(
-        (models.Contact.first_name.ilike(f"%{query}%")) |
-        (models.Contact.last_name.ilike(f"%{query}%")) |
-        (models.Contact.email.ilike(f"%{query}%")) |
-        (models.Contact.phone_number.ilike(f"%{query}%"))
-    ).all()
+def get_contact_changes(db: Session, owner_id: int, since: int, limit: int = 100) -> list:
+    """
+    Повертає до ``limit + 1`` змін контактів власника з ревізією після ``since``:
+    наявні контакти та надгробки видалених, впорядковані за ревізією.
+    """
+    contacts = db.query(models.Contact).filter(
+        models.Contact.owner_id == owner_id, models.Contact.revision > since
+    ).order_by(models.Contact.revision).limit(limit + 1).all()
+    tombstones = db.query(models.ContactTombstone).filter(
+        models.ContactTombstone.owner_id == owner_id, models.ContactTombstone.revision > since
+    ).order_by(models.ContactTombstone.revision).limit(limit + 1).all()
+    return sorted(contacts + tombstones, key=lambda change: change.revision)[:limit + 1]
+
 
+def search_contacts(db: Session, owner_id: int, query: str, skip: int = 0, limit: int = 20,
+                    columns: Optional[Sequence[str]] = None):
+    owned = contact_query(db, columns).filter(models.Contact.owner_id == owner_id)
+    return ranked_search(owned, query).offset(skip).limit(limit).all()
 
-def get_upcoming_birthdays(db: Session):
-    today = datetime.now()
-    week_from_today = today + timedelta(days=7)
-    return db.query(models.Contact).filter(
-        (models.Contact.birth_date >= today) &
-        (models.Contact.birth_date <= week_from_today)
+
+def get_upcoming_birthdays(db: Session, owner_id: int, days: int = 7):
+    today = date.today()
+    query = db.query(models.Contact).filter(models.Contact.owner_id == owner_id)
+    start_key = models.birthday_key(today)
+    end_key = models.birthday_key(today + timedelta(days=days))
+    if days >= 365:
+        window = models.Contact.birthday_key.isnot(None)
+    elif start_key <= end_key:
+        window = models.Contact.birthday_key.between(start_key, end_key)
+    else:
+        window = (models.Contact.birthday_key >= start_key) | (models.Contact.birthday_key <= end_key)
+    return query.filter(window).order_by(
+        case((models.Contact.birthday_key >= start_key, 0), else_=1),
+        models.Contact.birthday_key,
     ).all()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    existing_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="User with this email already exists")
-    
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None,
+                outbox_message: Optional[schemas.EmailMessage] = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(email=user.email, password=hashed_password)
     db.add(db_user)
-    db.commit()
+    if outbox_message is not None:
+        db.add(models.OutboxMessage(**outbox_message.model_dump()))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="User with this email already exists")
     db.refresh(db_user)
     return db_user
 
@@ -82,11 +226,72 @@ def create_user(db: Session, user: schemas.UserCreate):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def verify_user(db: Session, email: str):
+    db_user = get_user_by_email(db, email)
+    if db_user:
+        db_user.is_verified = True
+        db.commit()
+        db.refresh(db_user)
+        invalidate_cached_user(db_user.email)
+        return db_user
+
+def update_user_avatar(db: Session, user_id: int, avatar_url: str):
+    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    if db_user:
+        db_user.avatar_url = avatar_url
+        db.commit()
+        db.refresh(db_user)
+        invalidate_cached_user(db_user.email)
+        return db_user
+
+def get_avatar(db: Session, content_hash: str):
+    return db.get(models.Avatar, content_hash)
+
+def save_avatar(db: Session, content_hash: str, url: str):
+    db_avatar = db.merge(models.Avatar(content_hash=content_hash, url=url))
+    db.commit()
+    return db_avatar
+
+def get_users(db: Session, skip: int = 0, limit: int = 10, after_id: Optional[int] = None):
+    query = db.query(models.User)
+    if after_id is not None:
+        return query.filter(models.User.id > after_id).order_by(models.User.id).limit(limit).all()
+    return query.order_by(models.User.id).offset(skip).limit(limit).all()
+
+
+def get_verified_users(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    query = db.query(models.User).filter(models.User.is_verified == True)
+    if after_id is not None:
+        return query.filter(models.User.id > after_id).order_by(models.User.id).limit(limit).all()
+    return query.order_by(models.User.id).offset(skip).limit(limit).all()
+
+
+def enqueue_email(db: Session, message: schemas.EmailMessage):
+    db_message = models.OutboxMessage(**message.model_dump())
+    db.add(db_message)
+    db.commit()
+    db.refresh(db_message)
+    return db_message
+
+
+def get_due_outbox_messages(db: Session, limit: int = 50):
+    return db.query(models.OutboxMessage).filter(
+        (models.OutboxMessage.status == "pending") &
+        (models.OutboxMessage.next_attempt_at <= datetime.utcnow())
+    ).order_by(models.OutboxMessage.id).limit(limit).with_for_update(skip_locked=True).all()
 
 
-def get_verified_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).filter(models.User.is_verified == True).offset(skip).limit(limit).all()
+def mark_outbox_sent(db: Session, message: models.OutboxMessage):
+    message.status = "sent"
+    message.attempts += 1
+    message.sent_at = datetime.utcnow()
+    message.last_error = None
 
 
+def mark_outbox_failed(db: Session, message: models.OutboxMessage, error: str, retry_in: Optional[timedelta]):
+    message.attempts += 1
+    message.last_error = error
+    if retry_in is None:
+        message.status = "failed"
+    else:
+        message.next_attempt_at = datetime.utcnow() + retry_in
@@ -1,15 +1,107 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from decouple import config
+from decouple import Csv, config
+import query_stats
+from pool_stats import PoolStats, TimedAsyncAdaptedQueuePool, TimedQueuePool
 
 SQLALCHEMY_DATABASE_URL = config('DATABASE_URL')
+DB_ASYNC = config('DB_ASYNC', default=False, cast=bool)
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default="", cast=Csv())
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=5, cast=int)
+DB_MAX_OVERFLOW = config('DB_MAX_OVERFLOW', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=30, cast=float)
+DB_POOL_RECYCLE = config('DB_POOL_RECYCLE', default=-1, cast=int)
+DB_POOL_PRE_PING = config('DB_POOL_PRE_PING', default=False, cast=bool)
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def pool_options(url: str, poolclass) -> dict:
+    """
+    Повертає налаштування пулу з'єднань для ``create_engine``.
+
+    SQLite у пам'яті працює з одним з'єднанням, тому для нього пул не
+    налаштовується.
+    """
+    if url.startswith("sqlite") and (":memory:" in url or url.endswith("://")):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_options(SQLALCHEMY_DATABASE_URL, TimedQueuePool))
+pool_stats = PoolStats()
+pool_stats.attach(engine)
+query_stats.attach(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+
+def async_database_url(url: str) -> str:
+    """
+    Перетворює URL синхронного драйвера на URL асинхронного (asyncpg, aiosqlite).
+    """
+    scheme, separator, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+
+ASYNC_DATABASE_URL = config('ASYNC_DATABASE_URL', default=async_database_url(SQLALCHEMY_DATABASE_URL))
+
+if DB_ASYNC:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, TimedAsyncAdaptedQueuePool))
+    async_pool_stats = PoolStats()
+    async_pool_stats.attach(async_engine.sync_engine)
+    query_stats.attach(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+else:
+    async_engine = None
+    async_pool_stats = None
+    AsyncSessionLocal = None
+
+
+class Replica:
+    """
+    Рушій і фабрики сесій однієї репліки для читання.
+
+    Параметри:
+        url (str): URL бази даних репліки (синхронний драйвер).
+        use_async (bool): Чи створювати також асинхронний рушій.
+    """
+
+    def __init__(self, url: str, use_async: bool = DB_ASYNC):
+        self.engine = create_engine(url, **pool_options(url, TimedQueuePool))
+        self.pool_stats = PoolStats()
+        self.pool_stats.attach(self.engine)
+        query_stats.attach(self.engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.async_engine = None
+        self.AsyncSessionLocal = None
+        if use_async:
+            async_url = async_database_url(url)
+            self.async_engine = create_async_engine(async_url, **pool_options(async_url, TimedAsyncAdaptedQueuePool))
+            self.async_pool_stats = PoolStats()
+            self.async_pool_stats.attach(self.async_engine.sync_engine)
+            query_stats.attach(self.async_engine.sync_engine)
+            self.AsyncSessionLocal = async_sessionmaker(self.async_engine, autoflush=False, expire_on_commit=False)
+
+
+replicas = [Replica(url) for url in DATABASE_REPLICA_URLS]
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -18,4 +110,23 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_session = get_async_db if DB_ASYNC else get_db
+
 
+def pool_status() -> dict:
+    """
+    Повертає статистику пулів з'єднань усіх налаштованих рушіїв.
+    """
+    status = {"primary": pool_stats.snapshot(engine)}
+    if async_engine is not None:
+        status["primary_async"] = async_pool_stats.snapshot(async_engine.sync_engine)
+    for index, replica in enumerate(replicas):
+        status[f"replica_{index}"] = replica.pool_stats.snapshot(replica.engine)
+        if replica.async_engine is not None:
+            status[f"replica_{index}_async"] = replica.async_pool_stats.snapshot(replica.async_engine.sync_engine)
+    return status
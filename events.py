@@ -0,0 +1,342 @@
+"""
+Потік змін контактів для підписників (server-sent events).
+
+``crud`` після фіксації зміни контакту публікує подію в ``hub``, а концентратор
+передає її підпискам власника контакту. Кожна підписка має обмежену чергу:
+клієнта, що не встигає її читати, відключає подія ``resync``. Після
+перепідключення він наздоганяє зміни через ``GET /contacts/changes``, тож
+повільний клієнт не накопичує пам'ять і не затримує інших.
+
+Без ``EVENTS_BROKER_URL`` події отримують лише підписники того ж воркера.
+З ``redis://хост:порт`` їх розсилає всім воркерам Redis через
+PUBLISH/SUBSCRIBE; отримана подія також скидає кеш відповідей власника
+у воркері, тож кеш не віддає дані, змінені іншим воркером.
+"""
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from decouple import config
+
+import response_cache
+import schemas
+import serialization
+from pagination import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=64, cast=int)
+EVENTS_HEARTBEAT_SECONDS = config('EVENTS_HEARTBEAT_SECONDS', default=15, cast=float)
+EVENTS_BROKER_URL = config('EVENTS_BROKER_URL', default="")
+EVENTS_CHANNEL = config('EVENTS_CHANNEL', default="contacts:events")
+
+RETRY = b"retry: 3000\n\n"
+HEARTBEAT = b": ping\n\n"
+RESYNC = b"event: resync\ndata: {}\n\n"
+
+
+def change_frame(event: str, change: dict) -> bytes:
+    """
+    Кодує зміну контакту як подію SSE з ``id`` - курсором для ``/contacts/changes``.
+    """
+    cursor = encode_cursor(change["revision"], kind="rev")
+    data = serialization.dump_json(schemas.ContactChange, change)
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (cursor.encode(), event.encode(), data)
+
+
+class Subscription:
+    """
+    Обмежена черга подій одного клієнта в циклі подій, де її створено.
+
+    ``None`` у черзі означає, що клієнта відключено через переповнення.
+    """
+
+    __slots__ = ("owner_id", "loop", "queue", "dropped")
+
+    def __init__(self, owner_id: int, maxsize: int):
+        self.owner_id = owner_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    def put(self, frame: bytes) -> bool:
+        """
+        Додає подію в чергу; повертає False, якщо черга переповнилась.
+        """
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+
+class EventHub:
+    """
+    Розсилає події підпискам власника контактів у цьому процесі.
+
+    ``publish`` можна викликати з будь-якого потоку: події передаються в цикл
+    подій підписки через ``call_soon_threadsafe``, один виклик на цикл, а не
+    на підписку. Підписка - це лише черга, тож тисячі неактивних з'єднань не
+    мають власних задач чи потоків.
+
+    Параметри:
+        queue_size (int): Місткість черги однієї підписки.
+        broker: Розсилка між воркерами з методами ``start(deliver)``,
+            ``publish(owner_id, frame)`` і ``stop()``; None - лише цей воркер.
+    """
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, broker=None):
+        self.queue_size = queue_size
+        self.broker = broker
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    async def start(self):
+        if self.broker is not None:
+            await self.broker.start(self._deliver_broadcast)
+
+    async def stop(self):
+        if self.broker is not None:
+            await self.broker.stop()
+
+    def wants(self, owner_id: int) -> bool:
+        """
+        Чи може подію власника хтось отримати; без цього подія не серіалізується.
+        """
+        return self.broker is not None or owner_id in self._subscriptions
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        """
+        Створює підписку на події власника; викликається в циклі подій клієнта.
+        """
+        subscription = Subscription(owner_id, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(owner_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.owner_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.owner_id]
+
+    def publish(self, owner_id: int, frame: bytes):
+        with self._lock:
+            self.published += 1
+        if self.broker is None:
+            self.deliver(owner_id, frame)
+        else:
+            self.broker.publish(owner_id, frame)
+
+    def deliver(self, owner_id: int, frame: bytes):
+        """
+        Передає подію підпискам власника в цьому процесі.
+        """
+        with self._lock:
+            by_loop: Dict[asyncio.AbstractEventLoop, List[Subscription]] = {}
+            for subscription in self._subscriptions.get(owner_id, ()):
+                by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._fan_out, subscriptions, frame)
+            except RuntimeError:
+                # Цикл подій уже закрито, ці підписки ніхто не читає.
+                for subscription in subscriptions:
+                    self.unsubscribe(subscription)
+
+    def _deliver_broadcast(self, owner_id: int, frame: bytes):
+        """
+        Подія з брокера: зміну міг зробити інший воркер, тож спершу
+        скидаються кешовані відповіді власника в цьому процесі.
+        """
+        response_cache.invalidate_owner_responses(owner_id)
+        self.deliver(owner_id, frame)
+
+    def _fan_out(self, subscriptions: List[Subscription], frame: bytes):
+        delivered, dropped = 0, []
+        for subscription in subscriptions:
+            if subscription.dropped:
+                continue
+            if subscription.put(frame):
+                delivered += 1
+            else:
+                dropped.append(subscription)
+        for subscription in dropped:
+            self.unsubscribe(subscription)
+        with self._lock:
+            self.delivered += delivered
+            self.dropped += len(dropped)
+
+    async def stream(self, subscription: Subscription, heartbeat: float = EVENTS_HEARTBEAT_SECONDS):
+        """
+        Віддає кадри SSE підписки, поки клієнт не відключиться або не відстане.
+
+        Коментар ``: ping`` кожні ``heartbeat`` секунд не дає проксі закрити
+        неактивне з'єднання.
+        """
+        try:
+            yield RETRY
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                if frame is None:
+                    yield RESYNC
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+                "owners": len(self._subscriptions),
+                "published": self.published,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "broker": type(self.broker).__name__ if self.broker is not None else None,
+            }
+
+
+class RedisBroker:
+    """
+    Розсилка подій між воркерами через PUBLISH/SUBSCRIBE Redis (``redis.asyncio``).
+
+    Кожен воркер, включно з тим, що опублікував подію, отримує її з каналу і
+    передає своїм підпискам. ``publish`` лише ставить подію в чергу
+    надсилання, тож не блокує ``crud``. Події, опубліковані без з'єднання,
+    губляться; клієнти наздоганяють їх через ``/contacts/changes``.
+
+    Параметри:
+        uri (str): ``redis://хост:порт/номер_бази``.
+        channel (str): Канал подій.
+        reconnect_delay (float): Пауза перед повторною підпискою, с.
+        max_pending (int): Скільки подій може чекати надсилання.
+    """
+
+    def __init__(self, uri: str, channel: str = EVENTS_CHANNEL, reconnect_delay: float = 1.0,
+                 max_pending: int = 10000):
+        self.uri = uri
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.max_pending = max_pending
+        self.subscribed: Optional[asyncio.Event] = None
+        self._client = None
+        self._errors: tuple = ()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._deliver: Optional[Callable[[int, bytes], None]] = None
+        self._outgoing: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, deliver: Callable[[int, bytes], None]):
+        # redis потрібен лише з EVENTS_BROKER_URL, тож імпортується тут.
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(self.uri)
+        self._errors = (redis.RedisError, OSError)
+        self._loop = asyncio.get_running_loop()
+        self._deliver = deliver
+        self._outgoing = asyncio.Queue(self.max_pending)
+        self.subscribed = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._send())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        await self._client.aclose()
+
+    def publish(self, owner_id: int, frame: bytes):
+        if self._loop is None:
+            logger.warning("Events broker is not started, contact event dropped")
+            return
+        self._loop.call_soon_threadsafe(self._enqueue, b"%d\n%s" % (owner_id, frame))
+
+    def _enqueue(self, payload: bytes):
+        try:
+            self._outgoing.put_nowait(payload)
+        except asyncio.QueueFull:
+            logger.warning("Events broker is behind, contact event dropped")
+
+    async def _send(self):
+        while True:
+            payload = await self._outgoing.get()
+            try:
+                await self._client.publish(self.channel, payload)
+            except self._errors:
+                logger.warning("Could not publish contact event", exc_info=True)
+
+    async def _listen(self):
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        self.subscribed.set()
+                    elif message["type"] == "message":
+                        owner_id, _, frame = message["data"].partition(b"\n")
+                        self._deliver(int(owner_id), frame)
+            except self._errors + (ValueError,):
+                logger.warning("Contact events subscription lost, reconnecting", exc_info=True)
+            finally:
+                self.subscribed.clear()
+                await pubsub.aclose()
+            await asyncio.sleep(self.reconnect_delay)
+
+
+BROKERS = {
+    "redis": RedisBroker,
+    "rediss": RedisBroker,
+}
+
+
+def broker_from_url(url: str):
+    if not url:
+        return None
+    return BROKERS[urlparse(url).scheme](url)
+
+
+hub = EventHub(EVENTS_QUEUE_SIZE, broker_from_url(EVENTS_BROKER_URL))
+
+
+def publish_contact_change(event: str, owner_id: int, contact_id: int, revision: int, contact=None):
+    """
+    Публікує подію ``created``, ``updated`` чи ``deleted`` для підписників власника.
+
+    Параметри:
+        event (str): Тип події.
+        owner_id (int): Власник контакту.
+        contact_id (int): Ідентифікатор контакту.
+        revision (int): Ревізія зміни.
+        contact: Контакт після зміни; None для видаленого.
+    """
+    if not hub.wants(owner_id):
+        return
+    hub.publish(owner_id, change_frame(event, {
+        "id": contact_id, "revision": revision, "deleted": contact is None, "contact": contact,
+    }))
+
+
+def publish_resync(owner_id: int):
+    """
+    Просить підписників власника перечитати зміни, наприклад після масового імпорту.
+    """
+    if hub.wants(owner_id):
+        hub.publish(owner_id, RESYNC)
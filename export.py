@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterable, Iterator
+
+from decouple import config
+from sqlalchemy import select
+
+import database
+import models
+
+EXPORT_BATCH_SIZE = config('EXPORT_BATCH_SIZE', default=1000, cast=int)
+
+EXPORT_COLUMNS = (
+    models.Contact.id,
+    models.Contact.first_name,
+    models.Contact.last_name,
+    models.Contact.email,
+    models.Contact.phone_number,
+    models.Contact.birth_date,
+)
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_statement(owner_id: int):
+    return (
+        select(*EXPORT_COLUMNS)
+        .where(models.Contact.owner_id == owner_id)
+        .order_by(models.Contact.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def header(data_format: str) -> bytes:
+    if data_format != "csv":
+        return b""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([column.key for column in EXPORT_COLUMNS])
+    return buffer.getvalue().encode()
+
+
+def encode_rows(rows: Iterable, data_format: str) -> bytes:
+    """
+    Кодує пакет рядків у CSV або NDJSON.
+    """
+    buffer = io.StringIO()
+    if data_format == "csv":
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(row)
+    else:
+        for row in rows:
+            record = row._asdict()
+            record["birth_date"] = record["birth_date"].isoformat() if record["birth_date"] else None
+            buffer.write(json.dumps(record))
+            buffer.write("\n")
+    return buffer.getvalue().encode()
+
+
+def iter_export(owner_id: int, data_format: str) -> Iterator[bytes]:
+    """
+    Віддає контакти власника пакетами, читаючи їх серверним курсором.
+
+    Для кожного пакета з ``EXPORT_BATCH_SIZE`` рядків формується один шматок
+    відповіді, тому пам'ять не залежить від кількості контактів, а перший
+    байт надсилається одразу після першого пакета.
+    """
+    yield header(data_format)
+    with database.SessionLocal() as db:
+        result = db.execute(export_statement(owner_id))
+        for rows in result.partitions():
+            yield encode_rows(rows, data_format)
+
+
+async def iter_export_async(owner_id: int, data_format: str) -> AsyncIterator[bytes]:
+    """
+    Асинхронний варіант ``iter_export`` для режиму ``DB_ASYNC``.
+    """
+    yield header(data_format)
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(export_statement(owner_id))
+        async for rows in result.partitions():
+            yield encode_rows(rows, data_format)
+
+
+def stream_contacts(owner_id: int, data_format: str):
+    if database.DB_ASYNC:
+        return iter_export_async(owner_id, data_format)
+    return iter_export(owner_id, data_format)
@@ -20,31 +20,131 @@ USE_CREDENTIALS = os.getenv("USE_CREDENTIALS")
 VALIDATE_CERTS = os.getenv("VALIDATE_CERTS")
 
 
-from fastapi import Depends, FastAPI
+import asyncio
+import hmac
+import logging
+from contextlib import asynccontextmanager
+
+from decouple import config
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import SQLAlchemyError
 import models
 import database
+import migrations
 import api
+import outbox
 from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+import avatars
 from pathlib import Path
+import auth
+import events
+import replicas
+import response_cache
+import query_stats
+import metrics
 from auth import OAuth2PasswordBearer
 import crud
 import schemas
 from sqlalchemy.orm import Session
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 from fastapi.middleware.cors import CORSMiddleware
+from slowapi import _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
 
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
+INTERNAL_TOKEN = config('INTERNAL_TOKEN', default="")
 
-models.Base.metadata.create_all(bind=database.engine)
+
+def require_internal_token(x_internal_token: str = Header("")):
+    """
+    Пропускає до службових ендпоінтів і ``/metrics`` лише запити із заголовком
+    ``X-Internal-Token``, рівним ``INTERNAL_TOKEN``; без налаштованого токена
+    вони закриті для всіх.
+    """
+    if not INTERNAL_TOKEN or not hmac.compare_digest(x_internal_token.encode(), INTERNAL_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+internal = APIRouter(prefix="/internal", dependencies=[Depends(require_internal_token)])
+
+
+async def check_schema():
+    """
+    Перевіряє, що міграції застосовані; недоступна база не зупиняє воркер.
+    """
+    try:
+        missing = await run_in_threadpool(migrations.missing_tables, database.engine)
+    except (SQLAlchemyError, OSError):
+        logger.warning("Database is unavailable, schema check skipped", exc_info=True)
+        return
+    if missing:
+        logger.error("Database schema is missing tables %s, run `python migrations.py`", ", ".join(missing))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Запускає фонові задачі воркера; перевірка схеми не затримує старт.
+    """
+    schema_check = asyncio.create_task(check_schema())
+    outbox.dispatcher.start()
+    metrics.registry.start()
+    await events.hub.start()
+    yield
+    schema_check.cancel()
+    await events.hub.stop()
+    await outbox.dispatcher.stop()
+    metrics.registry.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(api.router)
 
+app.state.limiter = api.limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+if avatars.AVATAR_STORAGE == "local":
+    os.makedirs(avatars.AVATAR_LOCAL_DIR, exist_ok=True)
+    app.mount(avatars.AVATAR_LOCAL_URL, StaticFiles(directory=avatars.AVATAR_LOCAL_DIR), name="avatars")
+
 @app.get("/")
 async def read_root():
     return {"message": "Hello, World!"}
 
+@app.get("/metrics", dependencies=[Depends(require_internal_token)])
+async def get_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@internal.get("/pool")
+async def get_pool_status():
+    return database.pool_status()
+
+@internal.get("/replicas")
+async def get_replica_status():
+    return replicas.router.stats()
+
+@internal.get("/events")
+async def get_event_hub_stats():
+    return events.hub.stats()
+
+@internal.get("/user-cache")
+async def get_user_cache_stats():
+    return auth.user_cache.stats()
+
+@internal.get("/response-cache")
+async def get_response_cache_stats():
+    return response_cache.response_cache.stats()
+
+@internal.get("/password-hasher")
+async def get_password_hasher_stats():
+    return auth.password_hasher.stats()
+
+app.include_router(internal)
+
 @app.get("/favicon.ico")
 async def get_favicon():
     favicon_path = Path("path_to_your_favicon.ico")
@@ -54,6 +154,9 @@ async def get_favicon():
         return {"message": "Favicon not found"}, 404
     
 
+app.add_middleware(query_stats.QueryStatsMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -0,0 +1,350 @@
+import bisect
+import functools
+import glob
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = config('METRICS_DIR', default="")
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=float)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STREAM_BUCKETS = (1.0, 10.0, 60.0, 300.0, 900.0, 3600.0, 14400.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[list]:
+        with self._lock:
+            return [[list(labels), self._export(value)] for labels, value in self._values.items()]
+
+    def _export(self, value):
+        return value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """
+    Гістограма з фіксованими межами кошиків.
+
+    Для кожного набору міток зберігаються лічильники кошиків (не кумулятивні),
+    сума та кількість спостережень; кумулятивні значення рахуються лише під
+    час формування відповіді ``/metrics``.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _export(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+
+class Registry:
+    """
+    Набір метрик процесу та їх експорт у текстовому форматі Prometheus.
+
+    Якщо задано ``directory``, кожен процес (воркер uvicorn) періодично
+    записує знімок своїх метрик у файл ``metrics-<pid>.json``, а ``render``
+    підсумовує знімки всіх процесів: лічильники та гістограми складаються,
+    а датчики (gauge) враховуються лише для живих процесів. Знімки завершених
+    воркерів лишаються в теці, тож лічильники не скидаються при перезапуску
+    воркера; теку слід очищати під час розгортання.
+
+    Параметри:
+        directory (str): Спільна для воркерів тека зі знімками або порожній рядок.
+        flush_interval (float): Період запису знімка в секундах.
+    """
+
+    def __init__(self, directory: str = "", flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.metrics: Dict[str, _Metric] = {}
+        self._flusher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        return {name: metric.samples() for name, metric in self.metrics.items()}
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def flush(self):
+        """
+        Записує знімок метрик поточного процесу у спільну теку.
+        """
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        with open(path + ".tmp", "w") as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(path + ".tmp", path)
+
+    def _flush_forever(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Failed to write metrics snapshot")
+
+    def start(self):
+        if self.directory and self._flusher is None:
+            self._stopped.clear()
+            self._flusher = threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True)
+            self._flusher.start()
+
+    def stop(self):
+        if self._flusher is not None:
+            self._stopped.set()
+            self._flusher.join()
+            self._flusher = None
+            self.flush()
+
+    def _snapshots(self) -> Iterable[Tuple[dict, bool]]:
+        own_pid = os.getpid()
+        yield self.snapshot(), True
+        if not self.directory:
+            return
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            pid = int(os.path.basename(path)[len("metrics-"):-len(".json")])
+            if pid == own_pid:
+                continue
+            try:
+                with open(path) as snapshot_file:
+                    yield json.load(snapshot_file), _process_alive(pid)
+            except (OSError, ValueError):
+                continue
+
+    def render(self) -> str:
+        """
+        Повертає метрики всіх процесів у текстовому форматі Prometheus.
+        """
+        merged: Dict[str, Dict[Tuple[str, ...], object]] = {name: {} for name in self.metrics}
+        for snapshot, alive in self._snapshots():
+            for name, samples in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.kind == "gauge" and not alive):
+                    continue
+                values = merged[name]
+                for labels, value in samples:
+                    labels = tuple(labels)
+                    if metric.kind == "histogram":
+                        current = values.get(labels)
+                        if current is None:
+                            values[labels] = [list(value[0]), value[1], value[2]]
+                        else:
+                            current[0] = [a + b for a, b in zip(current[0], value[0])]
+                            current[1] += value[1]
+                            current[2] += value[2]
+                    else:
+                        values[labels] = values.get(labels, 0.0) + value
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(merged[name].items()):
+                pairs = [f'{key}="{_escape(label)}"' for key, label in zip(metric.labelnames, labels)]
+                if metric.kind != "histogram":
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                    continue
+                bucket_counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric.buckets) + [float("inf")], bucket_counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    bucket_pair = f'le="{le}"'
+                    lines.append(f"{name}_bucket{_labels(pairs + [bucket_pair])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(pairs)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(pairs)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: List[str]) -> str:
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+registry = Registry(METRICS_DIR)
+
+REQUESTS = registry.counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+REQUEST_DURATION = registry.histogram("http_request_duration_seconds", "HTTP request duration.", ("method", "route"))
+IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests being processed.")
+STREAMS_OPEN = registry.gauge("http_streams_open", "Open streaming responses.", ("route",))
+STREAM_DURATION = registry.histogram("http_stream_duration_seconds", "Streaming response lifetime.", ("route",),
+                                     buckets=STREAM_BUCKETS)
+DEPENDENCY_DURATION = registry.histogram("dependency_duration_seconds", "Time spent in slow dependencies.", ("dependency",))
+CRUD_DURATION = registry.histogram("crud_duration_seconds", "Duration of crud operations.", ("operation",))
+
+
+@contextmanager
+def timer(histogram: Histogram, *labels: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *labels)
+
+
+def timed(histogram: Histogram, *labels: str):
+    """
+    Декоратор, що записує тривалість виклику функції (звичайної чи асинхронної) в ``histogram``.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer(histogram, *labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(histogram, *labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def streaming(endpoint):
+    """
+    Позначає ендпоінт із довгою потоковою відповіддю (server-sent events).
+
+    Такий запит перестає рахуватися в ``http_requests_in_flight`` після
+    початку відповіді, а час життя потоку записується в
+    ``http_stream_duration_seconds`` замість ``http_request_duration_seconds``,
+    щоб підключені клієнти не спотворювали перцентилі звичайних запитів.
+    """
+    endpoint.streaming = True
+    return endpoint
+
+
+class MetricsMiddleware:
+    """
+    ASGI-проміжний шар, що рахує запити за маршрутом і статусом, їх
+    тривалість і кількість запитів в обробці.
+
+    Маршрут береться з шаблону шляху (``/contacts/{contact_id}``), щоб
+    кількість часових рядів не залежала від значень параметрів. Маршрути,
+    позначені ``streaming``, мають окремі метрики потоків.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stream_route = None
+
+        async def send_with_status(message):
+            nonlocal status, stream_route
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                route = scope.get("route")
+                if status < 400 and getattr(getattr(route, "endpoint", None), "streaming", False):
+                    stream_route = route.path
+                    IN_FLIGHT.dec()
+                    STREAMS_OPEN.inc(stream_route)
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            if stream_route is None:
+                IN_FLIGHT.dec()
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_DURATION.observe(elapsed, scope["method"], route)
+            else:
+                route = stream_route
+                STREAMS_OPEN.dec(route)
+                STREAM_DURATION.observe(elapsed, route)
+            REQUESTS.inc(scope["method"], route, str(status))
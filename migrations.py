@@ -0,0 +1,187 @@
+import logging
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+import models
+import search
+
+logger = logging.getLogger(__name__)
+
+
+def _column_names(connection: Connection, table_name: str) -> set:
+    return {column["name"] for column in inspect(connection).get_columns(table_name)}
+
+
+def _create_contact_indexes(connection: Connection, *names: str):
+    for index in models.Contact.__table__.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+
+def add_contact_birthday_key(connection: Connection):
+    """
+    Додає до контактів колонку ``birthday_key`` (MMDD) з індексом і заповнює її.
+    """
+    if "birthday_key" not in _column_names(connection, "contacts"):
+        connection.execute(text("ALTER TABLE contacts ADD COLUMN birthday_key INTEGER"))
+        if connection.dialect.name == "sqlite":
+            expression = "CAST(strftime('%m%d', birth_date) AS INTEGER)"
+        else:
+            expression = "CAST(EXTRACT(MONTH FROM birth_date) * 100 + EXTRACT(DAY FROM birth_date) AS INTEGER)"
+        connection.execute(text(f"UPDATE contacts SET birthday_key = {expression} WHERE birth_date IS NOT NULL"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_contacts_birthday_key ON contacts (birthday_key)"))
+
+
+def add_user_avatar_url(connection: Connection):
+    """
+    Додає до користувачів колонку ``avatar_url``.
+    """
+    if "avatar_url" not in _column_names(connection, "users"):
+        connection.execute(text("ALTER TABLE users ADD COLUMN avatar_url VARCHAR"))
+
+
+def add_contact_owner_indexes(connection: Connection):
+    """
+    Додає складені індекси контактів за власником для запитів поточного користувача.
+    """
+    _create_contact_indexes(
+        connection,
+        "ix_contacts_owner_id_id",
+        "ix_contacts_owner_id_last_name_first_name",
+        "ix_contacts_owner_id_birthday_key",
+    )
+
+
+def add_contact_phone_digits(connection: Connection):
+    """
+    Додає до контактів номер телефону лише з цифр (і його обернену копію для
+    пошуку за закінченням номера), заповнює їх і створює індекси.
+
+    Якщо в одного власника кілька контактів з тим самим номером, нормалізований
+    номер отримує лише найстаріший з них, інакше унікальний індекс не створити.
+    У Postgres колонки отримують колацію "C", на якій покладається пошук за
+    префіксом і закінченням номера.
+    """
+    collate = ' COLLATE "C"' if connection.dialect.name == "postgresql" else ""
+    if "phone_digits" not in _column_names(connection, "contacts"):
+        connection.execute(text(f"ALTER TABLE contacts ADD COLUMN phone_digits VARCHAR{collate}"))
+        connection.execute(text(f"ALTER TABLE contacts ADD COLUMN phone_digits_reversed VARCHAR{collate}"))
+        seen, updates, skipped = set(), [], 0
+        rows = connection.execute(text("SELECT id, owner_id, phone_number FROM contacts ORDER BY id")).all()
+        for contact_id, owner_id, phone_number in rows:
+            digits = models.phone_digits(phone_number)
+            if digits is None:
+                continue
+            if (owner_id, digits) in seen:
+                skipped += 1
+                continue
+            seen.add((owner_id, digits))
+            updates.append({"id": contact_id, "digits": digits, "reversed": digits[::-1]})
+        if updates:
+            connection.execute(
+                text("UPDATE contacts SET phone_digits = :digits, phone_digits_reversed = :reversed WHERE id = :id"),
+                updates,
+            )
+        if skipped:
+            logger.warning("%d contacts share a phone number with another contact of the same owner "
+                           "and were left without phone_digits", skipped)
+    elif collate:
+        collations = dict(connection.execute(text(
+            "SELECT column_name, collation_name FROM information_schema.columns "
+            "WHERE table_name = 'contacts' AND column_name IN ('phone_digits', 'phone_digits_reversed')"
+        )).all())
+        for column, collation in collations.items():
+            if collation != "C":
+                connection.execute(text(f"ALTER TABLE contacts ALTER COLUMN {column} TYPE VARCHAR{collate}"))
+    _create_contact_indexes(connection, "ix_contacts_owner_id_phone_digits", "ix_contacts_owner_id_phone_digits_reversed")
+
+
+def add_contact_revisions(connection: Connection):
+    """
+    Додає ревізії контактів для стрічки змін.
+
+    Наявні контакти отримують ревізію, рівну їх id, а лічильник власника -
+    найбільшу ревізію його контактів, тож нові зміни йдуть після них.
+    ``updated_at``, як і в моделі, NOT NULL; SQLite не дозволяє додати таку
+    колонку з ``CURRENT_TIMESTAMP`` за замовчуванням, тому там вона
+    отримує сталу дату і одразу заповнюється.
+    """
+    if "contacts_revision" not in _column_names(connection, "users"):
+        connection.execute(text("ALTER TABLE users ADD COLUMN contacts_revision INTEGER NOT NULL DEFAULT 0"))
+    if "revision" not in _column_names(connection, "contacts"):
+        connection.execute(text("ALTER TABLE contacts ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"))
+        if connection.dialect.name == "postgresql":
+            connection.execute(text(
+                "ALTER TABLE contacts ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP"
+            ))
+            connection.execute(text("ALTER TABLE contacts ALTER COLUMN updated_at DROP DEFAULT"))
+        else:
+            connection.execute(text(
+                "ALTER TABLE contacts ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT '1970-01-01 00:00:00'"
+            ))
+        connection.execute(text("UPDATE contacts SET revision = id, updated_at = CURRENT_TIMESTAMP"))
+        connection.execute(text(
+            "UPDATE users SET contacts_revision = "
+            "(SELECT COALESCE(MAX(revision), 0) FROM contacts WHERE contacts.owner_id = users.id)"
+        ))
+    elif connection.dialect.name == "postgresql":
+        updated_at = next(column for column in inspect(connection).get_columns("contacts")
+                          if column["name"] == "updated_at")
+        if updated_at["nullable"]:
+            connection.execute(text("UPDATE contacts SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+            connection.execute(text("ALTER TABLE contacts ALTER COLUMN updated_at SET NOT NULL"))
+    _create_contact_indexes(connection, "ix_contacts_owner_id_revision")
+
+
+MIGRATIONS = [
+    add_contact_birthday_key,
+    add_user_avatar_url,
+    add_contact_owner_indexes,
+    add_contact_phone_digits,
+    add_contact_revisions,
+    search.create_search_index,
+]
+
+
+def upgrade(engine: Engine):
+    """
+    Доводить схему існуючої бази до поточної версії моделей.
+
+    Кожен крок ідемпотентний, тому його можна виконувати при кожному запуску.
+
+    Параметри:
+        engine (Engine): Рушій бази даних, схему якої потрібно оновити.
+    """
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            migration(connection)
+
+
+def migrate(engine: Engine):
+    """
+    Створює відсутні таблиці та виконує кроки ``MIGRATIONS``.
+
+    Запускається окремим кроком розгортання (``python migrations.py``)
+    перед стартом воркерів, а не під час імпорту застосунку.
+
+    Параметри:
+        engine (Engine): Рушій бази даних.
+    """
+    models.Base.metadata.create_all(bind=engine)
+    upgrade(engine)
+
+
+def missing_tables(engine: Engine) -> List[str]:
+    """
+    Повертає таблиці моделей, яких ще немає в базі.
+    """
+    existing = set(inspect(engine).get_table_names())
+    return sorted(set(models.Base.metadata.tables) - existing)
+
+
+if __name__ == "__main__":
+    import database
+
+    migrate(database.engine)
@@ -1,18 +1,73 @@
-from sqlalchemy import Boolean, Column, Integer, String, Date, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, Integer, String, Date, DateTime, ForeignKey, Index, Text
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import relationship, validates
 from database import Base
 
+
+def birthday_key(birth_date):
+    """
+    Повертає ключ дня народження у вигляді числа MMDD (наприклад, 1023 для 23 жовтня).
+    """
+    if birth_date is None:
+        return None
+    return birth_date.month * 100 + birth_date.day
+
+
+def phone_digits(phone_number: Optional[str]) -> Optional[str]:
+    """
+    Повертає номер телефону лише з цифр, без міжнародного префікса ``+`` чи ``00``
+    (``"+380 (50) 123-45-67"`` -> ``"380501234567"``), або None, якщо цифр немає.
+    """
+    if phone_number is None:
+        return None
+    digits = "".join(char for char in phone_number if char.isdigit())
+    if phone_number.lstrip().startswith("00"):
+        digits = digits[2:]
+    return digits or None
+
+
+# Двійкова колація "C" в Postgres впорядковує рядки цифр побайтово, тож діапазон
+# ``>= v AND < v || ':'`` містить рівно рядки з префіксом ``v``; лінгвістичні
+# колації (en_US.utf8) порівнюють інакше, і частина збігів губиться.
+PhoneDigits = String().with_variant(String(collation="C"), "postgresql")
+
+
 class Contact(Base):
     __tablename__ = "contacts"
+    __table_args__ = (
+        Index("ix_contacts_owner_id_id", "owner_id", "id"),
+        Index("ix_contacts_owner_id_last_name_first_name", "owner_id", "last_name", "first_name"),
+        Index("ix_contacts_owner_id_birthday_key", "owner_id", "birthday_key"),
+        Index("ix_contacts_owner_id_phone_digits", "owner_id", "phone_digits", unique=True),
+        Index("ix_contacts_owner_id_phone_digits_reversed", "owner_id", "phone_digits_reversed"),
+        Index("ix_contacts_owner_id_revision", "owner_id", "revision"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String, index=True, nullable=False)
     last_name = Column(String, index=True, nullable=False)
     email = Column(String, unique=True, nullable=False)
     phone_number = Column(String, nullable=False)
+    phone_digits = Column(PhoneDigits)
+    phone_digits_reversed = Column(PhoneDigits)
     birth_date = Column(Date)
+    birthday_key = Column(Integer, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     owner = relationship("User", back_populates="contacts")
+    revision = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @validates("birth_date")
+    def _sync_birthday_key(self, key, value):
+        self.birthday_key = birthday_key(value)
+        return value
+
+    @validates("phone_number")
+    def _sync_phone_digits(self, key, value):
+        self.phone_digits = phone_digits(value)
+        self.phone_digits_reversed = self.phone_digits[::-1] if self.phone_digits else None
+        return value
 
 
 class User(Base):
@@ -23,7 +78,48 @@ class User(Base):
     password = Column(String, nullable=False)
     contacts = relationship("Contact", back_populates="owner")
     is_verified = Column(Boolean, default=False)
+    avatar_url = Column(String)
+    contacts_revision = Column(Integer, nullable=False, default=0)
 
 
+class ContactTombstone(Base):
+    """
+    Запис про видалений контакт для стрічки змін ``/contacts/changes``.
+    """
 
+    __tablename__ = "contact_tombstones"
+    __table_args__ = (
+        Index("ix_contact_tombstones_owner_id_revision", "owner_id", "revision"),
+    )
 
+    id = Column(Integer, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    revision = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class Avatar(Base):
+    __tablename__ = "avatars"
+
+    content_hash = Column(String(64), primary_key=True)
+    url = Column(String, nullable=False)
+
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox_messages"
+    __table_args__ = (
+        Index("ix_outbox_messages_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    subtype = Column(String, nullable=False, default="html")
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime)
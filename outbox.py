@@ -0,0 +1,236 @@
+import asyncio
+import functools
+import logging
+from datetime import timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import TYPE_CHECKING, Callable, Optional, Union
+
+import aiosmtplib
+from decouple import config
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from metrics import DEPENDENCY_DURATION, timer
+from database import SessionLocal
+
+if TYPE_CHECKING:
+    from fastapi_mail import ConnectionConfig
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=50, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_BACKOFF_BASE = config('OUTBOX_BACKOFF_BASE', default=30, cast=float)
+OUTBOX_BACKOFF_MAX = config('OUTBOX_BACKOFF_MAX', default=3600, cast=float)
+OUTBOX_POLL_INTERVAL = config('OUTBOX_POLL_INTERVAL', default=5, cast=float)
+
+@functools.lru_cache(maxsize=None)
+def mail_settings() -> "ConnectionConfig":
+    """
+    Читає налаштування SMTP під час першого надсилання, а не під час імпорту.
+    """
+    from fastapi_mail import ConnectionConfig
+
+    return ConnectionConfig(
+        MAIL_USERNAME= config('MAIL_USERNAME'),
+        MAIL_PASSWORD= config('MAIL_PASSWORD'),
+        MAIL_FROM= config('MAIL_FROM'),
+        MAIL_PORT=config('MAIL_PORT', default=465, cast=int),
+        MAIL_SERVER=config('MAIL_SERVER', default="smtp.meta.ua"),
+        MAIL_FROM_NAME=config('MAIL_FROM_NAME', default="Example email"),
+        MAIL_STARTTLS=config('MAIL_STARTTLS', default=False, cast=bool),
+        MAIL_SSL_TLS=config('MAIL_SSL_TLS', default=True, cast=bool),
+        USE_CREDENTIALS=config('USE_CREDENTIALS', default=True, cast=bool),
+        VALIDATE_CERTS=config('VALIDATE_CERTS', default=True, cast=bool),
+    )
+
+
+def build_message(settings: "ConnectionConfig", message: models.OutboxMessage) -> EmailMessage:
+    email = EmailMessage()
+    email["From"] = formataddr((settings.MAIL_FROM_NAME or "", settings.MAIL_FROM))
+    email["To"] = message.recipient
+    email["Subject"] = message.subject
+    email.set_content(message.body, subtype=message.subtype)
+    return email
+
+
+class OutboxDispatcher:
+    """
+    Фоновий відправник листів із таблиці ``outbox_messages``.
+
+    Ендпоінти лише записують лист у таблицю (у тій самій транзакції, що й
+    решту змін), а диспетчер пакетами вибирає листи, час яких настав, і
+    надсилає їх через одне постійне SMTP-з'єднання. Невдала спроба відкладає
+    лист з експоненційною затримкою; після ``max_attempts`` спроб лист
+    позначається як ``failed``. Якщо не вдається підключитися чи
+    автентифікуватися на SMTP-сервері, спроби листів не витрачаються: пакет
+    лишається в черзі, а диспетчер чекає з тією ж експоненційною затримкою.
+
+    Параметри:
+        session_factory (Callable[[], Session]): Фабрика сесій бази даних.
+        settings (ConnectionConfig): Налаштування SMTP-сервера або функція,
+            що повертає їх під час першого звернення.
+        batch_size (int): Максимальна кількість листів за один прохід.
+        max_attempts (int): Кількість спроб надсилання одного листа.
+        backoff_base (float): Затримка перед другою спробою в секундах.
+        backoff_max (float): Максимальна затримка між спробами в секундах.
+        poll_interval (float): Пауза між проходами, якщо нових листів немає.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 settings: Union["ConnectionConfig", Callable[[], "ConnectionConfig"]],
+                 batch_size: int = OUTBOX_BATCH_SIZE, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 backoff_base: float = OUTBOX_BACKOFF_BASE, backoff_max: float = OUTBOX_BACKOFF_MAX,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self._settings = settings
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.connection_failures = 0
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def settings(self) -> "ConnectionConfig":
+        if callable(self._settings):
+            self._settings = self._settings()
+        return self._settings
+
+    def retry_delay(self, attempts: int) -> Optional[timedelta]:
+        """
+        Повертає затримку перед наступною спробою або None, якщо спроби вичерпано.
+        """
+        if attempts >= self.max_attempts:
+            return None
+        return timedelta(seconds=min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)))
+
+    def connection_delay(self) -> float:
+        """
+        Повертає паузу в секундах перед повторним підключенням до SMTP-сервера.
+        """
+        return min(self.backoff_max, self.backoff_base * 2 ** (self.connection_failures - 1))
+
+    async def _connection(self) -> aiosmtplib.SMTP:
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.noop()
+                return self._smtp
+            except (aiosmtplib.SMTPException, OSError):
+                await self.close()
+        settings = self.settings
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.MAIL_SERVER,
+            port=settings.MAIL_PORT,
+            use_tls=settings.MAIL_SSL_TLS,
+            start_tls=settings.MAIL_STARTTLS,
+            validate_certs=settings.VALIDATE_CERTS,
+        )
+        try:
+            await smtp.connect()
+            if settings.USE_CREDENTIALS:
+                await smtp.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
+        except BaseException:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        return smtp
+
+    async def close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+    async def drain_once(self) -> int:
+        """
+        Надсилає один пакет листів, час яких настав.
+
+        Повертає:
+            int: Кількість листів, які намагалися надіслати (надісланих і
+            відкладених); 0, якщо SMTP-сервер недоступний.
+        """
+        db = self.session_factory()
+        try:
+            messages = await run_in_threadpool(crud.get_due_outbox_messages, db, self.batch_size)
+            if not messages:
+                await run_in_threadpool(db.rollback)
+                return 0
+            try:
+                smtp = await self._connection()
+            except (aiosmtplib.SMTPException, OSError) as error:
+                self.connection_failures += 1
+                logger.warning("SMTP server is unavailable, retrying in %.0f s: %s", self.connection_delay(), error)
+                await run_in_threadpool(db.rollback)
+                return 0
+            self.connection_failures = 0
+            attempted = 0
+            for message in messages:
+                attempted += 1
+                try:
+                    with timer(DEPENDENCY_DURATION, "smtp_send"):
+                        await smtp.send_message(build_message(self.settings, message))
+                except (aiosmtplib.SMTPException, OSError) as error:
+                    logger.warning("Failed to send outbox message %s: %s", message.id, error)
+                    crud.mark_outbox_failed(db, message, str(error), self.retry_delay(message.attempts + 1))
+                    if isinstance(error, (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, OSError)):
+                        # Решта пакета чекає наступного проходу, а не вичерпує спроби на мертвому з'єднанні.
+                        await self.close()
+                        break
+                else:
+                    crud.mark_outbox_sent(db, message)
+            await run_in_threadpool(db.commit)
+            return attempted
+        finally:
+            await run_in_threadpool(db.close)
+
+    def wake(self):
+        """
+        Будить диспетчер, щойно в таблицю додано новий лист.
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                processed = await self.drain_once()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                processed = 0
+            if self.connection_failures:
+                # Нові листи не прискорюють повторне підключення до недоступного сервера.
+                await asyncio.sleep(self.connection_delay())
+                self._wakeup.clear()
+            elif processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.close()
+
+
+dispatcher = OutboxDispatcher(SessionLocal, mail_settings)
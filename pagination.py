@@ -0,0 +1,65 @@
+import base64
+import binascii
+from typing import Optional
+
+from fastapi import HTTPException, Response
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int, kind: str = "id") -> str:
+    """
+    Кодує id останнього рядка сторінки в непрозорий курсор.
+
+    Параметри:
+        last_id (int): Первинний ключ (або ревізія) останнього рядка сторінки.
+        kind (str): Тип значення в курсорі, щоб курсори різних списків не змішувались.
+
+    Повертає:
+        str: Курсор для параметра ``after``.
+    """
+    return base64.urlsafe_b64encode(f"{kind}:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str = "id") -> int:
+    """
+    Розкодовує курсор, отриманий від клієнта.
+
+    Параметри:
+        cursor (str): Курсор з параметра ``after``.
+        kind (str): Очікуваний тип значення в курсорі.
+
+    Повертає:
+        int: Первинний ключ, після якого починається наступна сторінка.
+
+    Викликає:
+        HTTPException: 400, якщо курсор пошкоджений.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        prefix, _, value = base64.urlsafe_b64decode(padded).decode().partition(":")
+        if prefix != kind:
+            raise ValueError(cursor)
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def set_next_cursor(response: Response, rows: list, limit: int) -> Optional[str]:
+    """
+    Додає заголовок з курсором наступної сторінки, якщо сторінка заповнена.
+
+    Параметри:
+        response (Response): Відповідь, до якої додається заголовок.
+        rows (list): Рядки поточної сторінки, впорядковані за id.
+        limit (int): Розмір сторінки.
+
+    Повертає:
+        Optional[str]: Курсор наступної сторінки або None, якщо це остання сторінка.
+    """
+    if not rows or len(rows) < limit:
+        return None
+    next_cursor = encode_cursor(rows[-1].id)
+    response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return next_cursor
@@ -0,0 +1,104 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def verify_password(plain_password, hashed_password):
+    return password_hash.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password):
+    return password_hash.hash(password)
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Пул хешування паролів переповнений або не встиг виконати завдання вчасно.
+    """
+
+
+class PasswordHasher:
+    """
+    Виконує хешування та перевірку паролів bcrypt в обмеженому пулі поза циклом подій.
+
+    Одночасно в пулі може бути не більше ``workers + queue_size`` завдань; нові
+    запити понад цю межу, як і ті, що чекали довше за ``timeout`` секунд,
+    завершуються винятком ``PasswordHasherBusy``. Завдання, яке не дочекалось
+    результату, займає місце, доки не завершиться в пулі.
+
+    Параметри:
+        workers (int): Кількість потоків або процесів пулу.
+        queue_size (int): Кількість завдань, які можуть чекати на вільний обробник.
+        timeout (float): Максимальний час очікування результату в секундах.
+        kind (str): ``"thread"`` або ``"process"``. Процеси потрібні лише тоді,
+            коли бекенд bcrypt утримує GIL (чистий Python-бекенд passlib).
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float, kind: str = "thread"):
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self.timeout = timeout
+        self.kind = kind
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.pending += 1
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Місце в пулі звільняється, коли завдання справді завершилось: після
+        # тайм-ауту потік, що вже хешує, не зупинити, і він досі зайнятий.
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy()
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(get_password_hash, password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "rejected": self.rejected,
+            }
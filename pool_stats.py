@@ -0,0 +1,144 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class _Timing:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self, scale: float = 1.0) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count * scale if self.count else 0.0,
+            "max": self.max * scale,
+        }
+
+
+class PoolStats:
+    """
+    Лічильники пулу з'єднань, які оновлюються подіями пулу SQLAlchemy.
+
+    Час очікування на з'єднання вимірюють пули ``TimedQueuePool`` та
+    ``TimedAsyncAdaptedQueuePool``; решту даних (кількість відкритих і закритих
+    з'єднань, час утримання та тривалість життя з'єднання) - обробники подій.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkout_wait = _Timing()
+        self.checkout_hold = _Timing()
+        self.connection_lifetime = _Timing()
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.checkout_timeouts = 0
+
+    def observe_wait(self, seconds: float):
+        with self._lock:
+            self.checkout_wait.observe(seconds)
+
+    def observe_timeout(self):
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def attach(self, engine: Engine):
+        """
+        Підписується на події пулу рушія ``engine``.
+        """
+        engine.pool.stats = self
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "close", self._on_close)
+        event.listen(engine, "close_detached", self._on_close_detached)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        connection_record.info["opened_at"] = time.monotonic()
+        with self._lock:
+            self.connections_opened += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.monotonic()
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            with self._lock:
+                self.checkout_hold.observe(time.monotonic() - checked_out_at)
+
+    def _on_close(self, dbapi_connection, connection_record):
+        opened_at = connection_record.info.pop("opened_at", None)
+        with self._lock:
+            self.connections_closed += 1
+            if opened_at is not None:
+                self.connection_lifetime.observe(time.monotonic() - opened_at)
+
+    def _on_close_detached(self, dbapi_connection):
+        with self._lock:
+            self.connections_closed += 1
+
+    def snapshot(self, engine: Engine) -> dict:
+        """
+        Повертає поточний стан пулу та накопичену статистику.
+
+        Параметри:
+            engine (Engine): Рушій, пул якого описується.
+
+        Повертає:
+            dict: Розмір пулу, зайняті та вільні з'єднання, переповнення, час
+            очікування і утримання з'єднання (мс) та тривалість життя з'єднань (с).
+        """
+        pool = engine.pool
+        with self._lock:
+            return {
+                "pool": pool.status(),
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "idle": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+                "connections_opened": self.connections_opened,
+                "connections_closed": self.connections_closed,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_wait_ms": self.checkout_wait.snapshot(1000),
+                "checkout_hold_ms": self.checkout_hold.snapshot(1000),
+                "connection_lifetime_s": self.connection_lifetime.snapshot(),
+            }
+
+
+class _TimedCheckout:
+    stats = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.observe_timeout()
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.observe_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
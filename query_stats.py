@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+STATEMENTS_HEADER = "X-DB-Statements"
+
+
+class QueryCounter:
+    """
+    Кількість SQL-запитів і сумарний час їх виконання в межах одного запиту до API.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.statements += 1
+            self.seconds += seconds
+
+
+_current: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    counter = _current.get()
+    if counter is not None:
+        counter.observe(time.perf_counter() - start)
+
+
+def attach(engine: Engine):
+    """
+    Підписується на події виконання SQL рушія ``engine``.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track():
+    """
+    Рахує SQL-запити, виконані всередині блоку, включно з потоками пулу та
+    greenlet-ами AsyncSession, які успадковують контекст.
+    """
+    counter = QueryCounter()
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+
+
+def query_budget(statements: int):
+    """
+    Оголошує максимальну кількість SQL-запитів для ендпоінта.
+
+    Параметри:
+        statements (int): Допустима кількість запитів, включно з аутентифікацією.
+    """
+    def decorator(endpoint):
+        endpoint.query_budget = statements
+        return endpoint
+    return decorator
+
+
+class BudgetViolation(NamedTuple):
+    method: str
+    path: str
+    statements: int
+    budget: int
+
+
+violations: Deque[BudgetViolation] = deque(maxlen=100)
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI-проміжний шар, що додає до відповіді кількість SQL-запитів
+    (``X-DB-Statements``) і час у базі (``Server-Timing: db``) та перевіряє
+    бюджет запитів маршруту.
+
+    Перевищення бюджету записується в ``violations`` і в журнал; тести
+    перевіряють, що цей список лишається порожнім.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track() as counter:
+            async def send_with_stats(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((STATEMENTS_HEADER.lower().encode(), str(counter.statements).encode()))
+                    headers.append((b"server-timing", f"db;dur={counter.seconds * 1000:.3f}".encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
+
+        route = scope.get("route")
+        budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+        logger.debug("%s %s: %d statements, %.3f ms", scope["method"], scope["path"],
+                     counter.statements, counter.seconds * 1000)
+        if budget is not None and counter.statements > budget:
+            violation = BudgetViolation(scope["method"], route.path, counter.statements, budget)
+            violations.append(violation)
+            logger.warning("Query budget exceeded: %s", violation)
@@ -0,0 +1,230 @@
+"""
+Сховища лічильників для ``slowapi``/``limits`` і ключі обмеження частоти.
+
+``shm:///шлях/до/файлу`` - таблиця лічильників у спільному файлі, відображеному
+в пам'ять (``/dev/shm``), спільна для всіх воркерів одного хоста.
+Для кількох хостів підходить вбудоване сховище ``limits`` ``redis://хост:порт``
+(пакет ``redis``); ``storage_options`` обмежують його тайм-аути, бо
+``slowapi`` перевіряє ліміти синхронно в циклі подій.
+"""
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import jwt
+from decouple import config
+from fastapi import Request
+from limits.storage import Storage
+from slowapi.util import get_remote_address
+
+logger = logging.getLogger(__name__)
+
+SECRET_KEY = config('SECRET_KEY')
+ALGORITHM = "HS256"
+RATE_LIMIT_TIMEOUT = config('RATE_LIMIT_TIMEOUT', default=0.25, cast=float)
+
+_SLOT = struct.Struct("=Qqd")
+
+
+class SharedMemoryStorage(Storage):
+    """
+    Лічильники фіксованого вікна в хеш-таблиці з відкритою адресацією у
+    спільному файлі.
+
+    Кожен слот містить хеш ключа, лічильник і момент закінчення вікна.
+    Ключ шукається не далі ніж за ``probes`` слотів від домашнього, а
+    прострочені слоти, знайдені під час пошуку, видаляються зсувом наступних
+    записів назад; кожен ``incr`` ще й перевіряє кілька наступних слотів
+    таблиці по колу. Тож таблиця не забивається старими ключами, а пошук під
+    блокуванням має обмежену вартість. Якщо всі слоти в межах проб зайняті
+    живими ключами, витісняється лічильник, вікно якого закінчується першим,
+    і це записується в журнал; таблиця за замовчуванням (65536 слотів,
+    1,5 МБ) розрахована на десятки тисяч активних клієнтів. Доступ
+    серіалізується блокуванням ``flock`` на тому ж файлі, тож таблицю
+    безпечно ділять процеси uvicorn.
+
+    Параметри:
+        uri (str): ``shm:///dev/shm/contacts-ratelimit?slots=65536&probes=64``.
+    """
+
+    STORAGE_SCHEME = ["shm"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        parsed = urlparse(uri)
+        self.path = parsed.path
+        query = parse_qs(parsed.query)
+        self.slots = int(query.get("slots", ["65536"])[0])
+        self.probes = min(int(query.get("probes", ["64"])[0]), self.slots)
+        self._sweep_at = 0
+        size = self.slots * _SLOT.size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    def _read(self, index: int) -> Tuple[int, int, float]:
+        return _SLOT.unpack_from(self._map, index * _SLOT.size)
+
+    def _write(self, index: int, key_hash: int, count: int, expires_at: float):
+        _SLOT.pack_into(self._map, index * _SLOT.size, key_hash, count, expires_at)
+
+    def _find(self, key_hash: int, now: float) -> Tuple[Optional[int], int]:
+        """
+        Повертає слот ключа (або None) і слот, куди його можна вставити.
+        """
+        home = key_hash % self.slots
+        soonest, soonest_expires_at = home, float("inf")
+        probe = 0
+        while probe < self.probes:
+            index = (home + probe) % self.slots
+            slot_hash, _, expires_at = self._read(index)
+            if slot_hash == key_hash:
+                return index, index
+            if slot_hash == 0:
+                return None, index
+            if expires_at <= now:
+                # На місце видаленого слота зсувається наступний запис ланцюжка.
+                self._delete(index)
+                continue
+            if expires_at < soonest_expires_at:
+                soonest, soonest_expires_at = index, expires_at
+            probe += 1
+        logger.warning("Rate limit table %s is full within %d probes, evicting the counter that expires first",
+                       self.path, self.probes)
+        return None, soonest
+
+    def _delete(self, index: int):
+        """
+        Звільняє слот, зсуваючи назад записи, чий ланцюжок проб проходить через нього.
+        """
+        hole = index
+        for step in range(1, self.slots):
+            current = (index + step) % self.slots
+            slot_hash, count, expires_at = self._read(current)
+            if slot_hash == 0:
+                break
+            home = slot_hash % self.slots
+            if (current - home) % self.slots >= (current - hole) % self.slots:
+                self._write(hole, slot_hash, count, expires_at)
+                hole = current
+        self._write(hole, 0, 0, 0.0)
+
+    def _sweep(self, now: float, count: int = 4):
+        """
+        Видаляє прострочені записи серед наступних ``count`` слотів таблиці.
+        """
+        for _ in range(count):
+            slot_hash, _, expires_at = self._read(self._sweep_at)
+            if slot_hash and expires_at <= now:
+                self._delete(self._sweep_at)
+            else:
+                self._sweep_at = (self._sweep_at + 1) % self.slots
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        key_hash = self._hash(key)
+        with self._locked():
+            now = time.time()
+            self._sweep(now)
+            index, insert_at = self._find(key_hash, now)
+            if index is not None:
+                _, count, expires_at = self._read(index)
+                if expires_at > now:
+                    count += amount
+                    self._write(index, key_hash, count, expires_at)
+                    return count
+            self._write(insert_at, key_hash, amount, now + expiry)
+            return amount
+
+    def get(self, key: str) -> int:
+        with self._locked():
+            now = time.time()
+            index, _ = self._find(self._hash(key), now)
+            if index is None:
+                return 0
+            _, count, expires_at = self._read(index)
+            return count if expires_at > now else 0
+
+    def get_expiry(self, key: str) -> float:
+        with self._locked():
+            now = time.time()
+            index, _ = self._find(self._hash(key), now)
+            if index is None:
+                return now
+            _, _, expires_at = self._read(index)
+            return max(expires_at, now)
+
+    def check(self) -> bool:
+        return not self._map.closed
+
+    def reset(self) -> Optional[int]:
+        with self._locked():
+            cleared = sum(1 for index in range(self.slots) if self._read(index)[0])
+            self._map[:] = bytes(len(self._map))
+            return cleared
+
+    def clear(self, key: str) -> None:
+        key_hash = self._hash(key)
+        with self._locked():
+            index, _ = self._find(key_hash, time.time())
+            if index is not None:
+                self._delete(index)
+
+
+def storage_options(uri: str) -> dict:
+    """
+    Параметри сховища для ``Limiter``: для Redis - короткі тайм-аути з'єднання
+    і відповіді, щоб недоступний сервер не зупиняв цикл подій надовго.
+    """
+    if urlparse(uri).scheme in ("redis", "rediss"):
+        return {"socket_timeout": RATE_LIMIT_TIMEOUT, "socket_connect_timeout": RATE_LIMIT_TIMEOUT}
+    return {}
+
+
+def user_or_address(request: Request) -> str:
+    """
+    Ключ обмеження частоти: користувач з bearer-токена або, для анонімних
+    запитів, IP-адреса клієнта.
+
+    Токен лише перевіряється підписом, без звернення до бази, тому ключ
+    коштує одне декодування JWT.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            subject = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except jwt.PyJWTError:
+            subject = None
+        if subject:
+            return f"user:{subject}"
+    return f"ip:{get_remote_address(request)}"
+
+
+KEY_FUNCS = {
+    "user": user_or_address,
+    "ip": get_remote_address,
+}
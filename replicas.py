@@ -0,0 +1,142 @@
+"""
+Маршрутизація запитів на читання між основною базою та репліками.
+
+Репліки задаються змінною ``DATABASE_REPLICA_URLS`` (URL через кому); без неї
+всі запити йдуть в основну базу. Після зміни контактів клієнт на
+``READ_YOUR_WRITES_SECONDS`` секунд закріплюється за основною базою, щоб
+одразу бачити власні зміни, поки репліки їх наздоганяють. Закріплення
+передається підписаним cookie з часом його закінчення, тож діє в усіх
+воркерах; для клієнтів без cookie воно також зберігається в пам'яті
+воркера, який обробив запис.
+"""
+import hashlib
+import hmac
+import itertools
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from decouple import config
+from fastapi import Request, Response
+
+import database
+import rate_limit
+
+READ_YOUR_WRITES_SECONDS = config('READ_YOUR_WRITES_SECONDS', default=5, cast=float)
+PIN_COOKIE = "read_primary_until"
+
+
+class ReadRouter:
+    """
+    Обирає репліку для читання по колу, якщо клієнт не закріплений за основною базою.
+
+    Параметри:
+        replicas (List[database.Replica]): Репліки для читання.
+        window (float): Тривалість закріплення за основною базою після запису, с.
+        key_func (Callable[[Request], str]): Ключ клієнта (користувач або IP-адреса).
+        secret (str): Ключ підпису cookie закріплення.
+    """
+
+    def __init__(self, replicas: List[database.Replica], window: float = READ_YOUR_WRITES_SECONDS,
+                 key_func: Callable[[Request], str] = rate_limit.user_or_address,
+                 secret: str = rate_limit.SECRET_KEY):
+        self.replicas = list(replicas)
+        self.window = window
+        self.key_func = key_func
+        self.secret = secret.encode()
+        self.primary_reads = 0
+        self.replica_reads = 0
+        self._pins: Dict[str, float] = {}
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def _signature(self, key: str, until: str) -> str:
+        return hmac.new(self.secret, f"{key}|{until}".encode(), hashlib.sha256).hexdigest()
+
+    def pin(self, request: Request, response: Optional[Response] = None):
+        """
+        Закріплює клієнта запиту за основною базою на ``window`` секунд.
+
+        З ``response`` закріплення також записується в cookie, яке бачать усі воркери.
+        """
+        if not self.replicas or self.window <= 0:
+            return
+        key = self.key_func(request)
+        now = time.monotonic()
+        with self._lock:
+            self._pins = {pinned: until for pinned, until in self._pins.items() if until > now}
+            self._pins[key] = now + self.window
+        if response is not None:
+            until = f"{time.time() + self.window:.3f}"
+            response.set_cookie(PIN_COOKIE, f"{until}:{self._signature(key, until)}",
+                                max_age=math.ceil(self.window), httponly=True, samesite="lax")
+
+    def _cookie_pinned(self, request: Request) -> bool:
+        """
+        Чи має запит чинне cookie закріплення, видане цьому ж клієнту.
+        """
+        until, _, signature = request.cookies.get(PIN_COOKIE, "").partition(":")
+        try:
+            expired = float(until) <= time.time()
+        except ValueError:
+            return False
+        return not expired and hmac.compare_digest(signature, self._signature(self.key_func(request), until))
+
+    def choose(self, request: Request) -> Optional[database.Replica]:
+        """
+        Повертає репліку для запиту або None, якщо читати треба з основної бази.
+        """
+        if not self.replicas:
+            return None
+        # Ключ клієнта рахується лише тоді, коли хтось закріплений.
+        pinned_until = self._pins.get(self.key_func(request)) if self._pins else None
+        pinned = pinned_until is not None and pinned_until > time.monotonic()
+        pinned = pinned or (PIN_COOKIE in request.cookies and self._cookie_pinned(request))
+        with self._lock:
+            if pinned:
+                self.primary_reads += 1
+                return None
+            self.replica_reads += 1
+            return self.replicas[next(self._turn) % len(self.replicas)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "replicas": len(self.replicas),
+                "window_seconds": self.window,
+                "pinned_clients": sum(1 for until in self._pins.values() if until > time.monotonic()),
+                "primary_reads": self.primary_reads,
+                "replica_reads": self.replica_reads,
+            }
+
+
+router = ReadRouter(database.replicas)
+
+
+def pin_to_primary(request: Request, response: Optional[Response] = None):
+    """
+    Викликається після зміни контактів, щоб клієнт прочитав власний запис.
+    """
+    router.pin(request, response)
+
+
+def get_read_db(request: Request):
+    replica = router.choose(request)
+    request.state.read_replica = replica is not None
+    db = (replica.SessionLocal if replica is not None else database.SessionLocal)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    replica = router.choose(request)
+    request.state.read_replica = replica is not None
+    session_factory = replica.AsyncSessionLocal if replica is not None else database.AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
+
+
+get_read_session = get_async_read_db if database.DB_ASYNC else get_read_db
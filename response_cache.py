@@ -0,0 +1,185 @@
+import functools
+import hashlib
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, NamedTuple, Optional, Set, Tuple
+
+from decouple import config
+from fastapi import Request, Response
+
+import replicas
+import serialization
+
+RESPONSE_CACHE_SIZE = config('RESPONSE_CACHE_SIZE', default=2048, cast=int)
+RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=5, cast=float)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+
+    def to_response(self, request: Request) -> Response:
+        """
+        Повертає 304 без тіла, якщо клієнт уже має цю версію (``If-None-Match``).
+        """
+        headers = {**self.headers, "ETag": self.etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+class ResponseCache:
+    """
+    Потокобезпечний LRU-кеш серіалізованих відповідей з ETag.
+
+    Ключ запису містить власника даних (``None`` для відповідей, що не
+    залежать від користувача). Зміна контактів власника видаляє його записи
+    та всі спільні записи. Лічильник поколінь не дає зберегти відповідь,
+    прочитану з бази до зміни, яка завершилась під час її формування.
+    Відповідь, прочитану з репліки невдовзі після зміни, ``cached`` не
+    зберігає, бо репліка могла ще не отримати цю зміну.
+
+    Кеш належить процесу: зміну, зроблену іншим воркером, він бачить лише
+    через події ``events`` (з ``EVENTS_BROKER_URL``), тому кожен запис живе
+    не довше ``ttl`` секунд.
+
+    Параметри:
+        maxsize (int): Максимальна кількість записів; найстаріші витісняються.
+        ttl (float): Час життя запису, с.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = RESPONSE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Hashable, Tuple[CachedResponse, float]]" = OrderedDict()
+        self._keys_by_owner: Dict[Optional[int], Set[Hashable]] = {}
+        self._generations: Dict[Optional[int], int] = {}
+        self._invalidated_at: Dict[Optional[int], float] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, owner_id: Optional[int]) -> int:
+        with self._lock:
+            return self._generations.get(owner_id, 0)
+
+    def invalidated_within(self, owner_id: Optional[int], seconds: float) -> bool:
+        with self._lock:
+            invalidated_at = self._invalidated_at.get(owner_id)
+        return invalidated_at is not None and time.monotonic() - invalidated_at < seconds
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry, expires_at = self._entries.get(key, (None, 0.0))
+            if entry is None or expires_at <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                    self._keys_by_owner[key[0]].discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: Hashable, owner_id: Optional[int], generation: int, entry: CachedResponse) -> bool:
+        """
+        Зберігає запис, якщо дані власника не змінювались з моменту ``generation``.
+        """
+        with self._lock:
+            if self._generations.get(owner_id, 0) != generation:
+                return False
+            self._entries[key] = (entry, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self._keys_by_owner.setdefault(owner_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self._keys_by_owner[evicted[0]].discard(evicted)
+            return True
+
+    def invalidate_owner(self, owner_id: int):
+        with self._lock:
+            self.invalidations += 1
+            now = time.monotonic()
+            for owner in {owner_id, None}:
+                self._invalidated_at[owner] = now
+                self._generations[owner] = self._generations.get(owner, 0) + 1
+                for key in self._keys_by_owner.pop(owner, ()):
+                    self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_owner.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+def invalidate_owner_responses(owner_id: int):
+    """
+    Видаляє з кешу відповідей усе, що залежить від контактів ``owner_id``.
+    """
+    response_cache.invalidate_owner(owner_id)
+
+
+def cached(response_model, owner: Optional[str] = None):
+    """
+    Кешує JSON-відповідь ендпоінта за шляхом, параметрами запиту та власником.
+
+    Ендпоінт повинен мати параметр ``request``; якщо він має параметр
+    ``response``, встановлені в ньому заголовки зберігаються разом із тілом.
+    Повторний запит з відповідним ``If-None-Match`` отримує 304.
+
+    Параметри:
+        response_model: Тип відповіді, яким серіалізується результат ендпоінта,
+            або функція, що обчислює його з аргументів ендпоінта.
+        owner (Optional[str]): Назва параметра з поточним користувачем, якщо
+            відповідь залежить від нього.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs["request"]
+            owner_id = kwargs[owner].id if owner else None
+            key = (owner_id, request.url.path, tuple(sorted(request.query_params.multi_items())))
+            entry = response_cache.get(key)
+            if entry is None:
+                generation = response_cache.generation(owner_id)
+                result = await endpoint(*args, **kwargs)
+                model = response_model(kwargs) if inspect.isfunction(response_model) else response_model
+                body = serialization.dump_json(model, result)
+                sub_response = kwargs.get("response")
+                headers = dict(sub_response.headers) if sub_response is not None else {}
+                entry = CachedResponse(body, make_etag(body), headers)
+                from_replica = getattr(request.state, "read_replica", False)
+                if not (from_replica and response_cache.invalidated_within(owner_id, replicas.router.window)):
+                    response_cache.set(key, owner_id, generation, entry)
+            return entry.to_response(request)
+        return wrapper
+
+    return decorator
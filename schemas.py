@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import date
-from pydantic import BaseModel
+from typing import List, Optional
 
 
 class ContactBase(BaseModel):
@@ -11,24 +11,27 @@ class ContactBase(BaseModel):
     birth_date: date
 
 class ContactCreate(ContactBase):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-    
-    @property
-    def model_dict(self):
-        return {
-            "first_name": self.first_name,
-            "last_name": self.last_name,
-            "email": self.email,
-            "phone_number": self.phone_number,
-            "birth_date": self.birth_date
-        }
+    pass
 
 class Contact(ContactBase):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+class ContactBatch(BaseModel):
+    contacts: List[Contact]
+    missing: List[int]
+
+class ContactChange(BaseModel):
     id: int
+    revision: int
+    deleted: bool
+    contact: Optional[Contact] = None
 
-    class Config:
-        orm_mode = True
+class ContactChanges(BaseModel):
+    changes: List[ContactChange]
+    cursor: str
+    has_more: bool
 
 
 class UserBase(BaseModel):
@@ -38,9 +41,26 @@ class UserCreate(UserBase):
     password: str
 
 class User(UserBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
 
-    class Config:
-        orm_mode = True
 
+class EmailMessage(BaseModel):
+    recipient: str
+    subject: str
+    body: str
+    subtype: str = "html"
+
+
+class BulkImportError(BaseModel):
+    line: int
+    email: Optional[str] = None
+    error: str
 
+class BulkImportResult(BaseModel):
+    inserted: int
+    duplicates: int
+    invalid: int
+    errors: List[BulkImportError]
+    errors_truncated: bool
@@ -0,0 +1,138 @@
+from sqlalchemy import column, func, literal_column, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Query
+
+import models
+
+
+SEARCH_COLUMNS = ("first_name", "last_name", "email", "phone_number")
+
+# Триграмний токенізатор FTS5 не знаходить рядки, коротші за три символи.
+MIN_FTS_QUERY_LENGTH = 3
+
+contacts_fts = table("contacts_fts", column("rowid"), column("rank"))
+
+_SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE contacts_fts USING fts5(
+        {", ".join(SEARCH_COLUMNS)},
+        content='contacts', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN
+        INSERT INTO contacts_fts(rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES (new.id, {", ".join("new." + name for name in SEARCH_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join("old." + name for name in SEARCH_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join("old." + name for name in SEARCH_COLUMNS)});
+        INSERT INTO contacts_fts(rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES (new.id, {", ".join("new." + name for name in SEARCH_COLUMNS)});
+    END
+    """,
+    "INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')",
+]
+
+_SEARCH_TEXT = " || ' ' || ".join(f"coalesce({name}, '')" for name in SEARCH_COLUMNS)
+
+_POSTGRES_DDL = [
+    f"""
+    ALTER TABLE contacts ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', {_SEARCH_TEXT})) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_contacts_search_vector ON contacts USING gin (search_vector)",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""
+    ALTER TABLE contacts ADD COLUMN IF NOT EXISTS search_text text
+    GENERATED ALWAYS AS ({_SEARCH_TEXT}) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_contacts_search_text_trgm ON contacts USING gin (search_text gin_trgm_ops)",
+]
+
+
+def create_search_index(connection: Connection):
+    """
+    Створює структури повнотекстового пошуку для таблиці контактів.
+
+    На SQLite це FTS5-таблиця з триграмним токенізатором, яку синхронізують
+    тригери; на Postgres - згенеровані колонки ``tsvector`` (слова) і
+    ``search_text`` (усі поля разом) з GIN-індексами, для другої - триграмним
+    (``pg_trgm``), який обслуговує ``ILIKE '%підрядок%'``.
+    Повторний виклик нічого не змінює.
+
+    Параметри:
+        connection (Connection): З'єднання, в якому виконується DDL.
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contacts_fts'")
+        ).first()
+        if not exists:
+            for statement in _SQLITE_DDL:
+                connection.execute(text(statement))
+    elif dialect == "postgresql":
+        for statement in _POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+def substring_search(query: Query, term: str) -> Query:
+    """
+    Пошук підрядка через ``ILIKE`` по всіх колонках без індексу.
+
+    Використовується, коли повнотекстовий пошук недоступний або рядок пошуку
+    закороткий для триграм.
+    """
+    return query.filter(
+        (models.Contact.first_name.ilike(f"%{term}%")) |
+        (models.Contact.last_name.ilike(f"%{term}%")) |
+        (models.Contact.email.ilike(f"%{term}%")) |
+        (models.Contact.phone_number.ilike(f"%{term}%"))
+    ).order_by(models.Contact.id)
+
+
+def ranked_search(query: Query, term: str) -> Query:
+    """
+    Додає до запиту контактів умову пошуку та впорядкування за релевантністю.
+
+    Параметри:
+        query (Query): Запит до ``models.Contact``.
+        term (str): Рядок пошуку.
+
+    Повертає:
+        Query: Запит, відфільтрований і впорядкований за релевантністю.
+    """
+    term = term.strip()
+    dialect = query.session.get_bind().dialect.name
+    if dialect == "sqlite" and len(term) >= MIN_FTS_QUERY_LENGTH:
+        phrase = '"' + term.replace('"', '""') + '"'
+        return (
+            query.join(contacts_fts, contacts_fts.c.rowid == models.Contact.id)
+            .filter(text("contacts_fts MATCH :phrase").bindparams(phrase=phrase))
+            .order_by(contacts_fts.c.rank, models.Contact.id)
+        )
+    if dialect == "postgresql" and term:
+        # Слова запиту розбирає сам Postgres; підрядок (частина email чи номера)
+        # знаходить ILIKE по триграмному індексу, як і в пошуку без індексу.
+        tsquery = func.websearch_to_tsquery("simple", term)
+        search_vector = literal_column("contacts.search_vector")
+        search_text = literal_column("contacts.search_text")
+        pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return (
+            query.filter(search_vector.op("@@")(tsquery) | search_text.ilike(pattern, escape="\\"))
+            .order_by(
+                func.ts_rank(search_vector, tsquery).desc(),
+                func.similarity(search_text, term).desc(),
+                models.Contact.id,
+            )
+        )
+    return substring_search(query, term)
@@ -0,0 +1,50 @@
+from functools import lru_cache
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def type_adapter(response_model) -> TypeAdapter:
+    """
+    Повертає ``TypeAdapter`` для типу відповіді, створюючи його лише один раз.
+    """
+    return TypeAdapter(response_model)
+
+
+def dump_json(response_model, value: Any) -> bytes:
+    """
+    Перевіряє ``value`` за типом ``response_model`` і кодує його в JSON.
+
+    ORM-об'єкти читаються через ``from_attributes`` за один прохід
+    pydantic-core, а результат кодується orjson, минаючи ``jsonable_encoder``
+    і стандартний модуль json, якими FastAPI обробляє ``response_model``.
+
+    Параметри:
+        response_model: Тип відповіді, наприклад ``List[schemas.Contact]``.
+        value (Any): ORM-об'єкт, список ORM-об'єктів або словники.
+
+    Повертає:
+        bytes: Тіло відповіді.
+    """
+    adapter = type_adapter(response_model)
+    return orjson.dumps(adapter.dump_python(adapter.validate_python(value, from_attributes=True)))
+
+
+def json_response(response_model, value: Any, response: Optional[Response] = None) -> Response:
+    """
+    Формує JSON-відповідь через ``dump_json``.
+
+    Параметри:
+        response_model: Тип відповіді.
+        value (Any): Дані відповіді.
+        response (Optional[Response]): Відповідь ендпоінта, заголовки якої
+            (наприклад, курсор наступної сторінки) потрібно зберегти.
+
+    Повертає:
+        Response: Готова відповідь.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return Response(content=dump_json(response_model, value), media_type="application/json", headers=headers)
@@ -0,0 +1,77 @@
+"""
+Вибір полів контакту параметром ``fields`` (sparse fieldsets).
+
+Запитані поля передаються в ``crud`` як список колонок, тож база повертає
+лише їх, а ORM-об'єкти не створюються; відповідь серіалізується звуженою
+моделлю з тими самими полями.
+"""
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Query
+from pydantic import ConfigDict, create_model
+
+import schemas
+
+CONTACT_FIELDS = tuple(schemas.Contact.model_fields)
+
+
+class Projection(NamedTuple):
+    columns: Optional[Tuple[str, ...]]
+    model: type
+
+
+@lru_cache(maxsize=None)
+def contact_model(columns: Tuple[str, ...]) -> type:
+    """
+    Повертає модель контакту лише з полями ``columns``, створюючи її один раз.
+    """
+    return create_model(
+        "Contact_" + "_".join(columns),
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (schemas.Contact.model_fields[name].annotation, ...) for name in columns},
+    )
+
+
+@lru_cache(maxsize=None)
+def batch_model(model: type) -> type:
+    if model is schemas.Contact:
+        return schemas.ContactBatch
+    return create_model(model.__name__ + "Batch", contacts=(List[model], ...), missing=(List[int], ...))
+
+
+def contact_fields(fields: Optional[str] = Query(None, pattern=r"^\w+(,\w+)*$")) -> Projection:
+    """
+    Розбирає параметр ``fields``; ``id`` додається завжди, бо потрібен для курсорів.
+
+    Параметри:
+        fields (Optional[str]): Назви полів через кому; без параметра - всі поля.
+
+    Повертає:
+        Projection: Колонки для запиту (None - всі) та модель відповіді.
+
+    Викликає:
+        HTTPException: 422, якщо поле не існує.
+    """
+    if fields is None:
+        return Projection(None, schemas.Contact)
+    requested = set(fields.split(",")) | {"id"}
+    unknown = requested.difference(CONTACT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    columns = tuple(name for name in CONTACT_FIELDS if name in requested)
+    return Projection(columns, contact_model(columns))
+
+
+def list_response_model(endpoint_kwargs: dict) -> type:
+    """
+    Тип відповіді для списку контактів ендпоінта з параметром ``fields``.
+    """
+    return List[endpoint_kwargs["fields"].model]
+
+
+def batch_response_model(endpoint_kwargs: dict) -> type:
+    """
+    Тип відповіді пакетного читання контактів з параметром ``fields``.
+    """
+    return batch_model(endpoint_kwargs["fields"].model)
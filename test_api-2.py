@@ -1,10 +1,23 @@
+import asyncio
+import csv
+import io
 import json
+import socket
+import time
 import pytest
+from datetime import date, datetime, timedelta
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 from main import app
 from auth import create_access_token
+import query_stats
+
+@pytest.fixture(autouse=True)
+def query_budgets():
+    query_stats.violations.clear()
+    yield
+    assert list(query_stats.violations) == []
 
 @pytest.fixture(scope="module")
 def db():
@@ -16,6 +29,13 @@ def db():
 def client():
     return TestClient(app)
 
+@pytest.fixture
+def internal_headers(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "INTERNAL_TOKEN", "internal-test-token")
+    return {"X-Internal-Token": "internal-test-token"}
+
 @pytest.fixture(scope="module")
 def test_user(db):
     from models import User
@@ -103,6 +123,35 @@ def test_update_contact(client, db, access_token):
     updated_contact = response.json()
     assert updated_contact["first_name"] == updated_data["first_name"]
 
+def test_update_contact_requires_owner(client, db, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    contact_data = {
+        "first_name": "Owned",
+        "last_name": "Contact",
+        "email": "owned-contact@example.com",
+        "phone_number": "380500000811",
+        "birth_date": "1991-02-03"
+    }
+    contact = client.post("/contacts/", headers=headers, json=contact_data).json()
+    from models import User
+    from crud import create_user
+
+    create_user(db, User(email="intruder@example.com", password="password"))
+    intruder_token = create_access_token(data={"sub": "intruder@example.com"})
+    revision = lambda: db.query(User.contacts_revision).filter(User.email == "test@gmail.com").scalar()
+    before = revision()
+
+    hijacked = {**contact_data, "first_name": "Hijacked"}
+    assert client.put(f"/contacts/{contact['id']}", json=hijacked).status_code == 401
+    response = client.put(f"/contacts/{contact['id']}", json=hijacked,
+                          headers={"Authorization": f"Bearer {intruder_token}"})
+    assert response.status_code == 404
+    assert "set-cookie" not in response.headers
+
+    assert client.get(f"/contacts/{contact['id']}", headers=headers).json()["first_name"] == "Owned"
+    db.rollback()
+    assert revision() == before
+
 def test_delete_contact(client, db, access_token):
     new_contact_data = {
         "first_name": "Bob",
@@ -148,6 +197,53 @@ def test_upcoming_birthdays(client, db, access_token):
     )
     assert response.status_code == 200
 
+def test_upcoming_birthdays_matches_anniversary(client, db, access_token):
+    birth_date = (date.today() + timedelta(days=2)).replace(year=2000)
+    contact_data = {
+        "first_name": "Anniversary",
+        "last_name": "Contact",
+        "email": "anniversary@example.com",
+        "phone_number": "8888888888",
+        "birth_date": birth_date.isoformat()
+    }
+    response = client.post(
+        "/contacts/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        json=contact_data
+    )
+    assert response.status_code == 200
+    contact_id = response.json()["id"]
+
+    response = client.get("/contacts/birthdays/?days=3", headers={"Authorization": f"Bearer {access_token}"})
+    assert response.status_code == 200
+    assert contact_id in [contact["id"] for contact in response.json()]
+
+    response = client.get("/contacts/birthdays/?days=1", headers={"Authorization": f"Bearer {access_token}"})
+    assert response.status_code == 200
+    assert contact_id not in [contact["id"] for contact in response.json()]
+
+def test_upcoming_birthdays_ordered_from_today_across_new_year(db, monkeypatch):
+    import crud
+    import schemas
+    from models import User
+
+    class Today(date):
+        @classmethod
+        def today(cls):
+            return cls(2026, 10, 17)
+
+    monkeypatch.setattr(crud, "date", Today)
+    owner = crud.create_user(db, User(email="birthday-order@example.com", password="password"))
+    for index, birth_date in enumerate(["1990-01-05", "1985-10-20", "1979-10-16", "2001-12-31"]):
+        crud.create_contact(db, schemas.ContactCreate(
+            first_name=f"Order{index}", last_name="Birthday", email=f"birthday-order-{index}@example.com",
+            phone_number=f"38050000090{index}", birth_date=birth_date,
+        ), owner.id)
+
+    upcoming = lambda days: [contact.birth_date.isoformat() for contact in crud.get_upcoming_birthdays(db, owner.id, days)]
+    assert upcoming(365) == ["1985-10-20", "2001-12-31", "1990-01-05", "1979-10-16"]
+    assert upcoming(90) == ["1985-10-20", "2001-12-31", "1990-01-05"]
+
 def test_search_contacts(client, db, access_token):
     contacts_data = [
         {"first_name": "John", "last_name": "Doe", "email": "john@example.com", "phone_number": "1111111111", "birth_date": "1990-01-01"},
@@ -169,6 +265,1042 @@ def test_search_contacts(client, db, access_token):
     )
     assert response.status_code == 200
 
+def test_search_contacts_ranked_and_limited(client, db, access_token):
+    response = client.get(
+        "/contacts/search/?query=Johnson&limit=1",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert len(results) == 1
+    assert "johnson" in (results[0]["last_name"] + results[0]["email"]).lower()
+
+def test_postgres_search_uses_websearch_and_trigram_substring():
+    from sqlalchemy import create_engine
+    from sqlalchemy.dialects import postgresql
+    from models import Contact
+    from search import ranked_search
+
+    session = Session(create_engine("postgresql://search@localhost/search"))
+    query = ranked_search(session.query(Contact.id), "o'brien 50_1\\")
+    compiled = query.statement.compile(dialect=postgresql.dialect())
+    sql, params = str(compiled), compiled.params
+    assert "websearch_to_tsquery" in sql and "to_tsquery(" not in sql.replace("websearch_to_tsquery(", "")
+    assert "contacts.search_text ILIKE" in sql and "similarity(contacts.search_text" in sql
+    assert "o'brien 50_1\\" in params.values()
+    assert "%o'brien 50\\_1\\\\%" in params.values()
+
+def test_contacts_cursor_pagination(client, db, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.get("/contacts/?limit=2", headers=headers)
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 2
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get(f"/contacts/?limit=2&after={cursor}", headers=headers)
+    assert response.status_code == 200
+    second_page = response.json()
+    assert second_page
+    assert second_page[0]["id"] > first_page[-1]["id"]
+
+def test_users_invalid_cursor(client):
+    response = client.get("/users/?after=not-a-cursor")
+    assert response.status_code == 400
+
+def test_internal_endpoints_require_token(client, monkeypatch):
+    import main
+
+    assert client.get("/internal/pool").status_code == 403
+    monkeypatch.setattr(main, "INTERNAL_TOKEN", "internal-test-token")
+    assert client.get("/internal/pool").status_code == 403
+    assert client.get("/internal/pool", headers={"X-Internal-Token": "wrong"}).status_code == 403
+    assert client.get("/internal/pool", headers={"X-Internal-Token": "internal-test-token"}).status_code == 200
+
+def test_pool_status(client, internal_headers):
+    client.get("/users/?limit=1")
+    response = client.get("/internal/pool", headers=internal_headers)
+    assert response.status_code == 200
+    primary = response.json()["primary"]
+    assert primary["checkout_wait_ms"]["count"] > 0
+    assert primary["checked_out"] + primary["idle"] == primary["connections_opened"] - primary["connections_closed"]
+
+def test_contact_changes_feed(client, db, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    def changes(since=None, limit=100):
+        query = f"?limit={limit}" + (f"&since={since}" if since else "")
+        response = client.get(f"/contacts/changes{query}", headers=headers)
+        assert response.status_code == 200
+        return response.json()
+
+    def sync(since):
+        seen = []
+        while True:
+            page = changes(since, limit=2)
+            seen += page["changes"]
+            since = page["cursor"]
+            if not page["has_more"]:
+                return seen, since
+
+    full = changes()
+    assert not full["has_more"]
+    cursor = full["cursor"]
+    assert changes(cursor)["changes"] == []
+
+    created = [client.post("/contacts/", headers=headers, json={
+        "first_name": f"Feed{i}", "last_name": "Sync", "email": f"feed-{i}@example.com",
+        "phone_number": f"38050000004{i}", "birth_date": "1993-04-05",
+    }).json() for i in range(3)]
+    client.put(f"/contacts/{created[0]['id']}", headers=headers, json={
+        "first_name": "Feed0", "last_name": "Updated", "email": "feed-0@example.com",
+        "phone_number": "380500000040", "birth_date": "1993-04-05",
+    })
+    client.delete(f"/contacts/{created[1]['id']}", headers=headers)
+
+    seen, cursor = sync(cursor)
+    assert [(change["id"], change["deleted"]) for change in seen] == [
+        (created[2]["id"], False), (created[0]["id"], False), (created[1]["id"], True)
+    ]
+    assert [change["revision"] for change in seen] == sorted(change["revision"] for change in seen)
+    assert seen[1]["contact"]["last_name"] == "Updated"
+    assert seen[2]["contact"] is None
+    assert changes(cursor)["changes"] == []
+
+    for contact in (created[0], created[2]):
+        client.delete(f"/contacts/{contact['id']}", headers=headers)
+    assert [change["deleted"] for change in changes(cursor)["changes"]] == [True, True]
+    assert client.get("/contacts/changes?since=broken", headers=headers).status_code == 400
+
+def test_contact_events_stream(client, db, access_token):
+    import events
+    import metrics
+    from auth import invalidate_cached_user
+    from models import User
+
+    stranger = User(email="events-stranger@example.com", password="x")
+    db.add(stranger)
+    db.commit()
+    headers = {"Authorization": f"Bearer {access_token}"}
+    theirs = {"Authorization": f"Bearer {create_access_token(data={'sub': stranger.email})}"}
+
+    def write_contacts():
+        client.post("/contacts/", headers=theirs, json={
+            "first_name": "Other", "last_name": "Owner", "email": "events-other@example.com",
+            "phone_number": "380500000050", "birth_date": "1990-01-01",
+        })
+        contact = client.post("/contacts/", headers=headers, json={
+            "first_name": "Live", "last_name": "Event", "email": "events-live@example.com",
+            "phone_number": "380500000051", "birth_date": "1990-01-01",
+        }).json()
+        client.put(f"/contacts/{contact['id']}", headers=headers, json={
+            "first_name": "Live", "last_name": "Edited", "email": "events-live@example.com",
+            "phone_number": "380500000051", "birth_date": "1990-01-01",
+        })
+        client.delete(f"/contacts/{contact['id']}", headers=headers)
+
+    async def listen(frames_expected):
+        frames, started, disconnected = [], [], asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                started.append(message)
+            elif message.get("body"):
+                frames.append(message["body"].decode())
+                if len(frames) == frames_expected:
+                    disconnected.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": "/contacts/events", "raw_path": b"/contacts/events", "query_string": b"", "root_path": "",
+            "headers": [(b"host", b"testserver"), (b"authorization", headers["Authorization"].encode())],
+            "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+        }
+        invalidate_cached_user("test@gmail.com")
+        subscribers, checked_out = events.hub.stats()["subscribers"], engine.pool.checkedout()
+        in_flight = metrics.IN_FLIGHT._values.get((), 0.0)
+        stream = asyncio.create_task(app(scope, receive, send))
+        while events.hub.stats()["subscribers"] == subscribers or not started:
+            await asyncio.sleep(0.01)
+        # Відкритий потік не тримає з'єднання з пулу і не рахується як запит в обробці.
+        assert engine.pool.checkedout() == checked_out
+        assert metrics.IN_FLIGHT._values.get((), 0.0) == in_flight
+        assert metrics.STREAMS_OPEN._values[("/contacts/events",)] == 1
+        await asyncio.get_running_loop().run_in_executor(None, write_contacts)
+        await asyncio.wait_for(stream, 5)
+        assert events.hub.stats()["subscribers"] == subscribers
+        return started[0], frames
+
+    start, frames = asyncio.run(listen(4))
+    assert start["status"] == 200
+    assert metrics.STREAMS_OPEN._values[("/contacts/events",)] == 0
+    assert metrics.STREAM_DURATION._values[("/contacts/events",)][2] == 1
+    assert ("GET", "/contacts/events") not in metrics.REQUEST_DURATION._values
+    assert (b"content-type", b"text/event-stream; charset=utf-8") in start["headers"]
+    assert frames[0] == "retry: 3000\n\n"
+    parsed = [dict(line.split(": ", 1) for line in frame.strip().split("\n")) for frame in frames[1:]]
+    assert [frame["event"] for frame in parsed] == ["created", "updated", "deleted"]
+    changes = [json.loads(frame["data"]) for frame in parsed]
+    assert changes[1]["contact"]["last_name"] == "Edited"
+    assert changes[2]["deleted"] and changes[2]["contact"] is None
+    assert len({change["id"] for change in changes}) == 1
+
+    response = client.get(f"/contacts/changes?since={parsed[0]['id']}", headers=headers)
+    assert response.json()["changes"] == [changes[2]]
+    assert client.get("/contacts/events").status_code == 401
+
+def test_event_hub_drops_slow_subscribers():
+    import events
+
+    hub = events.EventHub(queue_size=2)
+
+    async def scenario():
+        slow, fast = hub.subscribe(1), hub.subscribe(1)
+        other = hub.subscribe(2)
+        for index in range(3):
+            hub.publish(1, b"frame-%d" % index)
+            await asyncio.sleep(0)
+            await fast.queue.get()
+        stream = hub.stream(slow, heartbeat=0.01)
+        frames = [frame async for frame in stream]
+        assert frames == [events.RETRY, events.RESYNC]
+        assert other.queue.empty()
+
+        heartbeat = hub.stream(other, heartbeat=0.01)
+        assert [await heartbeat.__anext__() for _ in range(2)] == [events.RETRY, events.HEARTBEAT]
+        await heartbeat.aclose()
+
+    asyncio.run(scenario())
+    stats = hub.stats()
+    assert (stats["subscribers"], stats["published"], stats["delivered"], stats["dropped"]) == (1, 3, 5, 1)
+
+def test_contact_events_fan_out_across_workers():
+    import events
+    from response_cache import response_cache
+
+    stand_in = RedisStandIn()
+    url = f"redis://127.0.0.1:{stand_in.port}"
+
+    async def scenario():
+        workers = [events.EventHub(broker=events.broker_from_url(url)) for _ in range(2)]
+        for worker in workers:
+            await worker.start()
+        try:
+            for worker in workers:
+                await asyncio.wait_for(worker.broker.subscribed.wait(), 5)
+            subscriptions = [worker.subscribe(7) for worker in workers]
+            frame = events.change_frame("deleted", {"id": 3, "revision": 9, "deleted": True, "contact": None})
+            await asyncio.get_running_loop().run_in_executor(None, workers[0].publish, 7, frame)
+            generation = response_cache.generation(7)
+            for subscription in subscriptions:
+                assert await asyncio.wait_for(subscription.queue.get(), 5) == frame
+            # Кожен воркер скидає кеш відповідей власника, навіть якщо змінив його інший.
+            assert response_cache.generation(7) == generation + 2
+        finally:
+            for worker in workers:
+                await worker.stop()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        stand_in.close()
+
+def test_find_contacts_by_phone(client, db, access_token):
+    from sqlalchemy import text
+    from models import Contact
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    contact = {"first_name": "Caller", "last_name": "Id", "email": "caller-id@example.com",
+               "phone_number": "+38 (050) 777-12-34", "birth_date": "1985-06-07"}
+    created = client.post("/contacts/", headers=headers, json=contact).json()
+    assert db.get(Contact, created["id"]).phone_digits == "380507771234"
+
+    def lookup(path):
+        return [found["id"] for found in client.get(f"/contacts/by-phone/{path}", headers=headers).json()]
+
+    assert lookup("380507771234") == [created["id"]]
+    assert lookup("00380%20507771234") == [created["id"]]
+    assert lookup("0507771234") == []
+    assert lookup("0507771234?match=suffix") == [created["id"]]
+    assert lookup("38050777?match=prefix") == [created["id"]]
+    assert client.get("/contacts/by-phone/none", headers=headers).status_code == 422
+
+    duplicate = {**contact, "email": "caller-id-2@example.com", "phone_number": "380-50-777-12-34"}
+    assert client.post("/contacts/", headers=headers, json=duplicate).status_code == 409
+    other = client.post("/contacts/", headers=headers, json={**duplicate, "phone_number": "380507770000"}).json()
+    assert client.put(f"/contacts/{other['id']}", headers=headers, json=duplicate).status_code == 409
+
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable
+
+    ddl = str(CreateTable(Contact.__table__).compile(dialect=postgresql.dialect()))
+    assert 'phone_digits VARCHAR COLLATE "C"' in ddl
+    assert 'phone_digits_reversed VARCHAR COLLATE "C"' in ddl
+
+    if engine.dialect.name == "sqlite":
+        assert "COLLATE" not in str(CreateTable(Contact.__table__).compile(engine))
+        query = db.query(Contact).filter(Contact.owner_id == 1, Contact.phone_digits_reversed >= "4321",
+                                         Contact.phone_digits_reversed < "4321:")
+        plan = db.execute(text("EXPLAIN QUERY PLAN " + str(query.statement.compile(
+            engine, compile_kwargs={"literal_binds": True})))).all()
+        assert "ix_contacts_owner_id_phone_digits_reversed" in " ".join(str(row) for row in plan)
+
+    for contact_id in (created["id"], other["id"]):
+        client.delete(f"/contacts/{contact_id}", headers=headers)
+
+def test_contact_reads_are_scoped_to_owner(client, db, access_token):
+    from sqlalchemy import inspect, text
+    from models import Contact, User
+
+    stranger = User(email="scoped-stranger@example.com", password="x")
+    db.add(stranger)
+    db.commit()
+    db.add(Contact(first_name="Scoped", last_name="Stranger", email="scoped-stranger-contact@example.com",
+                   phone_number="380500000031", birth_date=date.today().replace(year=1990), owner_id=stranger.id))
+    db.commit()
+    own = {"Authorization": f"Bearer {access_token}"}
+    theirs = {"Authorization": f"Bearer {create_access_token(data={'sub': stranger.email})}"}
+
+    assert client.get("/contacts/search/?query=Stranger").status_code == 401
+    assert client.get("/contacts/search/?query=Stranger", headers=own).json() == []
+    assert [c["last_name"] for c in client.get("/contacts/search/?query=Stranger", headers=theirs).json()] == ["Stranger"]
+    assert "Stranger" not in [c["last_name"] for c in client.get("/contacts/birthdays/?days=0", headers=own).json()]
+    assert [c["last_name"] for c in client.get("/contacts/birthdays/?days=0", headers=theirs).json()] == ["Stranger"]
+    assert [c["last_name"] for c in client.get("/contacts/?limit=100", headers=theirs).json()] == ["Stranger"]
+
+    indexes = {index["name"] for index in inspect(engine).get_indexes("contacts")}
+    assert {"ix_contacts_owner_id_id", "ix_contacts_owner_id_last_name_first_name",
+            "ix_contacts_owner_id_birthday_key"} <= indexes
+    if engine.dialect.name == "sqlite":
+        compiled = db.query(Contact.id).filter(Contact.owner_id == stranger.id, Contact.id > 0).order_by(Contact.id).limit(10)
+        plan = db.execute(text("EXPLAIN QUERY PLAN " + str(compiled.statement.compile(
+            engine, compile_kwargs={"literal_binds": True})))).all()
+        assert "ix_contacts_owner_id_id" in " ".join(str(row) for row in plan)
+
+    db.query(Contact).filter(Contact.owner_id == stranger.id).delete()
+    db.delete(stranger)
+    db.commit()
+
+def test_reads_go_to_replica_unless_client_recently_wrote(client, access_token, tmp_path, monkeypatch):
+    import database
+    import migrations
+    import replicas
+
+    replica = database.Replica(f"sqlite:///{tmp_path / 'replica.db'}")
+    migrations.migrate(replica.engine)
+    router = replicas.ReadRouter([replica], window=60)
+    monkeypatch.setattr(replicas, "router", router)
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    assert client.get("/users/", headers=headers).json() == []
+    response = client.post("/contacts/", headers=headers, json={
+        "first_name": "Replica",
+        "last_name": "Lagging",
+        "email": "replica-lag@example.com",
+        "phone_number": "380500000019",
+        "birth_date": "1990-05-05",
+    })
+    assert response.status_code == 200
+    contact_id = response.json()["id"]
+
+    # Автор запису читає з основної бази, інші клієнти - з репліки.
+    assert client.get("/users/", headers=headers).json() != []
+    assert client.get("/users/").json() == []
+    assert router.stats() == {**router.stats(), "primary_reads": 1, "replica_reads": 2}
+
+    # Інший воркер не має закріплення в пам'яті, але бачить його в cookie.
+    assert replicas.PIN_COOKIE in response.cookies
+    router._pins.clear()
+    found = client.get("/contacts/search/?query=Lagging", headers=headers).json()
+    assert [contact["id"] for contact in found] == [contact_id]
+    forged = {replicas.PIN_COOKIE: response.cookies[replicas.PIN_COOKIE].replace(":", ":0")}
+    replica_reads = router.stats()["replica_reads"]
+    assert client.get("/users/", headers=headers, cookies=forged).json() == []
+    assert router.stats()["replica_reads"] == replica_reads + 1
+
+    # Без закріплення клієнт читає з репліки, але застарілу відповідь не кешує.
+    client.cookies.clear()
+    assert client.get("/contacts/?limit=100", headers=headers).json() == []
+    router.replicas = []
+    assert contact_id in [contact["id"] for contact in client.get("/contacts/?limit=100", headers=headers).json()]
+
+    client.delete(f"/contacts/{contact_id}", headers=headers)
+    client.cookies.clear()
+
+def test_read_contacts_batch(client, db, access_token):
+    from models import Contact, User
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    created = []
+    for i in range(2):
+        response = client.post("/contacts/", headers=headers, json={
+            "first_name": f"Batch{i}",
+            "last_name": "Fetch",
+            "email": f"batch-{i}@example.com",
+            "phone_number": f"38050000002{i}",
+            "birth_date": "1991-02-03",
+        })
+        created.append(response.json()["id"])
+    stranger = User(email="batch-stranger@example.com", password="x")
+    db.add(stranger)
+    db.commit()
+    foreign = Contact(first_name="Foreign", last_name="Fetch", email="batch-foreign@example.com",
+                      phone_number="380500000029", birth_date=date(1991, 2, 3), owner_id=stranger.id)
+    db.add(foreign)
+    db.commit()
+
+    ids = [created[1], foreign.id, created[0], 999999, created[1]]
+    response = client.get(f"/contacts/batch?ids={','.join(map(str, ids))}", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["x-db-statements"] == "1"
+    body = response.json()
+    assert [contact["id"] for contact in body["contacts"]] == sorted(created)
+    assert body["missing"] == [foreign.id, 999999]
+
+    assert client.get("/contacts/batch?ids=1,x", headers=headers).status_code == 422
+    too_many = ",".join(str(i) for i in range(1, 502))
+    assert client.get(f"/contacts/batch?ids={too_many}", headers=headers).status_code == 422
+
+    for contact_id in created:
+        client.delete(f"/contacts/{contact_id}", headers=headers)
+    db.delete(foreign)
+    db.delete(stranger)
+    db.commit()
+
+def test_sparse_fieldsets(client, db, access_token):
+    import crud
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.post("/contacts/", headers=headers, json={
+        "first_name": "Sparse",
+        "last_name": "Fieldset",
+        "email": "sparse-fields@example.com",
+        "phone_number": "380500000030",
+        "birth_date": "1992-03-04",
+    })
+    contact_id = response.json()["id"]
+
+    owner_id = crud.get_user_by_email(db, "test@gmail.com").id
+    rows = crud.search_contacts(db, owner_id, "Fieldset", columns=("id", "first_name"))
+    assert [tuple(row._fields) for row in rows] == [("id", "first_name")]
+
+    response = client.get("/contacts/search/?query=Fieldset&fields=last_name,first_name", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == [{"first_name": "Sparse", "last_name": "Fieldset", "id": contact_id}]
+    full = client.get("/contacts/search/?query=Fieldset", headers=headers).json()
+    assert full[0]["email"] == "sparse-fields@example.com"
+
+    response = client.get(f"/contacts/batch?ids={contact_id}&fields=email", headers=headers)
+    assert response.json() == {"contacts": [{"email": "sparse-fields@example.com", "id": contact_id}], "missing": []}
+    response = client.get("/contacts/?limit=100&fields=first_name", headers=headers)
+    assert all(set(contact) == {"id", "first_name"} for contact in response.json())
+
+    response = client.get("/contacts/search/?query=Fieldset&fields=first_name,password", headers=headers)
+    assert response.status_code == 422
+    assert "password" in response.json()["detail"]
+
+    client.delete(f"/contacts/{contact_id}", headers=headers)
+
+def test_current_user_is_cached(client, access_token, internal_headers):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    client.get("/contacts/0", headers=headers)
+    hits = client.get("/internal/user-cache", headers=internal_headers).json()["hits"]
+
+    response = client.get("/contacts/0", headers=headers)
+    assert response.status_code == 404
+    assert client.get("/internal/user-cache", headers=internal_headers).json()["hits"] == hits + 1
+
+def test_contact_responses_are_cached_with_etag(client, access_token, internal_headers):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    contact_data = {
+        "first_name": "Etag",
+        "last_name": "Cached",
+        "email": "etag.cached@example.com",
+        "phone_number": "5550001111",
+        "birth_date": "1991-07-15"
+    }
+    contact = client.post("/contacts/", headers=headers, json=contact_data).json()
+
+    response = client.get(f"/contacts/{contact['id']}", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    hits = client.get("/internal/response-cache", headers=internal_headers).json()["hits"]
+
+    response = client.get(f"/contacts/{contact['id']}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/internal/response-cache", headers=internal_headers).json()["hits"] == hits + 1
+
+    search = client.get("/contacts/search/?query=Etag", headers=headers)
+    assert [item["id"] for item in search.json()] == [contact["id"]]
+
+    contact_data["first_name"] = "Etagged"
+    client.put(f"/contacts/{contact['id']}", headers=headers, json=contact_data)
+
+    response = client.get(f"/contacts/{contact['id']}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["first_name"] == "Etagged"
+
+    response = client.get("/contacts/search/?query=Etag", headers={**headers, "If-None-Match": search.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()[0]["first_name"] == "Etagged"
+
+    client.delete(f"/contacts/{contact['id']}", headers=headers)
+    assert client.get("/contacts/search/?query=Etag", headers=headers).json() == []
+
+def test_response_cache_entries_expire():
+    from response_cache import CachedResponse, ResponseCache
+
+    cache = ResponseCache(maxsize=8, ttl=0.05)
+    entry = CachedResponse(b"[]", '"etag"', {})
+    key = (7, "/contacts/", ())
+    assert cache.set(key, 7, cache.generation(7), entry)
+    assert cache.get(key) is entry
+    time.sleep(0.06)
+    assert cache.get(key) is None
+    assert cache.stats()["size"] == 0
+
+def test_metrics_endpoint(client, access_token, internal_headers):
+    client.get("/contacts/0", headers={"Authorization": f"Bearer {access_token}"})
+    assert client.get("/metrics").status_code == 403
+    response = client.get("/metrics", headers=internal_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/contacts/{contact_id}",status="404"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/contacts/{contact_id}",le="+Inf"}' in body
+    assert 'dependency_duration_seconds_count{dependency="get_current_user"}' in body
+    assert 'crud_duration_seconds_count{operation="get_contact"}' in body
+
+def test_metrics_aggregate_worker_snapshots(tmp_path):
+    from metrics import Registry
+
+    def worker_registry():
+        registry = Registry(str(tmp_path))
+        registry.counter("requests_total", "Requests.", ("route",))
+        registry.gauge("in_flight", "In flight.")
+        registry.histogram("duration_seconds", "Duration.", buckets=(0.1, 1.0))
+        return registry
+
+    dead_worker = worker_registry()
+    dead_worker.metrics["requests_total"].inc("/a", amount=2)
+    dead_worker.metrics["in_flight"].inc(amount=5)
+    dead_worker.metrics["duration_seconds"].observe(0.5)
+    with open(tmp_path / "metrics-999999999.json", "w") as snapshot_file:
+        json.dump(dead_worker.snapshot(), snapshot_file)
+
+    registry = worker_registry()
+    registry.metrics["requests_total"].inc("/a")
+    registry.metrics["in_flight"].inc()
+    registry.metrics["duration_seconds"].observe(0.05)
+    lines = registry.render().splitlines()
+    assert 'requests_total{route="/a"} 3' in lines
+    assert "in_flight 1" in lines
+    assert 'duration_seconds_bucket{le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{le="1"} 2' in lines
+    assert "duration_seconds_count 2" in lines
+
+def test_startup_reports_missing_schema_without_failing(tmp_path, monkeypatch, caplog):
+    from sqlalchemy import create_engine
+    import main
+    import migrations
+
+    empty_engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    monkeypatch.setattr(main.database, "engine", empty_engine)
+    with caplog.at_level("ERROR", logger="main"):
+        with TestClient(app) as started_client:
+            assert started_client.get("/").status_code == 200
+    assert "python migrations.py" in caplog.text
+    assert "contacts" in migrations.missing_tables(empty_engine)
+
+    migrations.migrate(empty_engine)
+    assert migrations.missing_tables(empty_engine) == []
+
+def test_migrations_upgrade_legacy_contacts_to_model_schema(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+    import migrations
+    import models
+
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    models.Base.metadata.create_all(bind=legacy_engine)
+    with legacy_engine.begin() as connection:
+        connection.execute(text("DROP TABLE contacts"))
+        connection.execute(text(
+            "CREATE TABLE contacts (id INTEGER PRIMARY KEY, first_name VARCHAR NOT NULL, last_name VARCHAR NOT NULL, "
+            "email VARCHAR NOT NULL UNIQUE, phone_number VARCHAR NOT NULL, birth_date DATE, "
+            "owner_id INTEGER NOT NULL REFERENCES users (id))"
+        ))
+        connection.execute(text("INSERT INTO users (id, email, password, contacts_revision) VALUES (1, 'legacy@example.com', 'x', 0)"))
+        connection.execute(text(
+            "INSERT INTO contacts VALUES (5, 'Legacy', 'Row', 'legacy-row@example.com', '+380 50 000 0005', '1990-01-01', 1)"
+        ))
+
+    migrations.upgrade(legacy_engine)
+    columns = {column["name"]: column for column in inspect(legacy_engine).get_columns("contacts")}
+    assert not columns["updated_at"]["nullable"] and not columns["revision"]["nullable"]
+    with legacy_engine.connect() as connection:
+        row = connection.execute(text("SELECT revision, updated_at, phone_digits FROM contacts")).one()
+        assert row.revision == 5 and row.updated_at is not None and row.phone_digits == "380500000005"
+        assert connection.execute(text("SELECT contacts_revision FROM users")).scalar_one() == 5
+
+def test_shared_memory_rate_limit_storage_is_shared_between_processes(tmp_path):
+    import multiprocessing
+    from limits import parse
+    from limits.storage import storage_from_string
+    from limits.strategies import FixedWindowRateLimiter
+
+    uri = f"shm://{tmp_path}/ratelimit?slots=64"
+    item = parse("5/minute")
+
+    def worker():
+        limiter = FixedWindowRateLimiter(storage_from_string(uri))
+        for _ in range(3):
+            limiter.hit(item, "user:a")
+
+    child = multiprocessing.get_context("fork").Process(target=worker)
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+
+    storage = storage_from_string(uri)
+    limiter = FixedWindowRateLimiter(storage)
+    assert limiter.hit(item, "user:a")
+    assert limiter.hit(item, "user:a")
+    assert not limiter.hit(item, "user:a")
+    assert limiter.hit(item, "user:b")
+    assert storage.reset() == 2
+    assert limiter.hit(item, "user:a")
+
+def test_shared_memory_rate_limit_storage_evicts_soonest_expiry_when_full(tmp_path, caplog):
+    from limits.storage import storage_from_string
+
+    storage = storage_from_string(f"shm://{tmp_path}/ratelimit?slots=4")
+    for index, expiry in enumerate([60, 30, 90, 120]):
+        storage.incr(f"key-{index}", expiry, amount=index + 1)
+    with caplog.at_level("WARNING", logger="rate_limit"):
+        assert storage.incr("key-new", 60) == 1
+    assert "is full" in caplog.text
+    assert storage.get("key-1") == 0
+    assert [storage.get(f"key-{index}") for index in (0, 2, 3)] == [1, 3, 4]
+    assert storage.get("key-new") == 1
+
+def test_shared_memory_rate_limit_storage_reclaims_expired_slots(tmp_path, monkeypatch, caplog):
+    import random
+    import rate_limit
+    from limits.storage import storage_from_string
+
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    storage = storage_from_string(f"shm://{tmp_path}/ratelimit?slots=32&probes=8")
+    occupied = lambda: sum(1 for index in range(storage.slots) if storage._read(index)[0])
+
+    # Дані лічильники мають збігатися зі словником при вставках, очищеннях і простроченні.
+    rng = random.Random(7)
+    model = {}
+    with caplog.at_level("WARNING", logger="rate_limit"):
+        for _ in range(3000):
+            key, action = f"key-{rng.randrange(20)}", rng.random()
+            if action < 0.6:
+                count, expires_at = model.get(key, (0, 0.0))
+                model[key] = (count + 1, expires_at) if expires_at > now[0] else (1, now[0] + rng.choice([1, 5]))
+                assert storage.incr(key, model[key][1] - now[0]) == model[key][0]
+            elif action < 0.7:
+                storage.clear(key)
+                model.pop(key, None)
+            else:
+                count, expires_at = model.get(key, (0, 0.0))
+                assert storage.get(key) == (count if expires_at > now[0] else 0)
+            now[0] += rng.random()
+    assert "is full" not in caplog.text
+
+    # Потік різних клієнтів не забиває таблицю простроченими хешами: пошук
+    # відсутнього ключа зупиняється на порожньому слоті, а не обходить таблицю.
+    storage.reset()
+    for index in range(500):
+        storage.incr(f"client-{index}", 1)
+        now[0] += 0.2
+    assert occupied() < storage.slots // 2
+    reads = []
+    read = storage._read
+    monkeypatch.setattr(storage, "_read", lambda index: reads.append(index) or read(index))
+    assert storage.get("absent") == 0
+    assert len(reads) <= storage.probes
+
+class RedisStandIn:
+    """
+    Мінімальний сервер з протоколом Redis (PUBLISH/SUBSCRIBE) для тестів ``RedisBroker``.
+    """
+
+    def __init__(self):
+        import socketserver
+        import threading
+
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = []
+                    for _ in range(int(line[1:])):
+                        length = int(self.rfile.readline()[1:])
+                        command.append(self.rfile.read(length + 2)[:-2])
+                    name = command[0].upper()
+                    with stand_in.lock:
+                        if name == b"SUBSCRIBE":
+                            stand_in.subscribers.setdefault(command[1], []).append(self.wfile)
+                            self.wfile.write(b"*3\r\n" + stand_in.bulk(b"subscribe") + stand_in.bulk(command[1]) + b":1\r\n")
+                        elif name == b"PUBLISH":
+                            message = b"*3\r\n" + b"".join(map(stand_in.bulk, [b"message", *command[1:]]))
+                            subscribers = stand_in.subscribers.get(command[1], [])
+                            for subscriber in subscribers:
+                                subscriber.write(message)
+                            self.wfile.write(b":%d\r\n" % len(subscribers))
+                        elif name == b"PING":
+                            self.wfile.write(b"+PONG\r\n")
+                        else:
+                            self.wfile.write(b"-ERR unknown command\r\n")
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def bulk(value):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def test_redis_rate_limit_storage_has_short_timeouts():
+    from limits.storage import RedisStorage, storage_from_string
+    from rate_limit import RATE_LIMIT_TIMEOUT, storage_options
+
+    options = storage_options("redis://127.0.0.1:6379/1")
+    assert options == {"socket_timeout": RATE_LIMIT_TIMEOUT, "socket_connect_timeout": RATE_LIMIT_TIMEOUT}
+    storage = storage_from_string("redis://127.0.0.1:6379/1", **options)
+    assert isinstance(storage, RedisStorage)
+    assert storage_options("memory://") == {}
+
+def test_rate_limit_key_uses_authenticated_user():
+    from starlette.requests import Request
+    from rate_limit import user_or_address
+
+    def request(headers):
+        return Request({"type": "http", "headers": [(name.encode(), value.encode()) for name, value in headers.items()],
+                        "client": ("10.0.0.1", 1234)})
+
+    alice = create_access_token(data={"sub": "alice@example.com"})
+    bob = create_access_token(data={"sub": "bob@example.com"})
+    assert user_or_address(request({"authorization": f"Bearer {alice}"})) == "user:alice@example.com"
+    assert user_or_address(request({"authorization": f"Bearer {bob}"})) == "user:bob@example.com"
+    assert user_or_address(request({"authorization": "Bearer forged"})) == "ip:10.0.0.1"
+    assert user_or_address(request({})) == "ip:10.0.0.1"
+
+def test_login_for_access_token(client, test_user):
+    response = client.post("/token", data={"username": test_user.email, "password": "password"})
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+
+    response = client.post("/token", data={"username": test_user.email, "password": "wrong"})
+    assert response.status_code == 400
+
+def test_login_rejected_when_password_hasher_is_full(client, test_user, monkeypatch):
+    import auth
+
+    monkeypatch.setattr(auth.password_hasher, "max_pending", 0)
+    response = client.post("/token", data={"username": test_user.email, "password": "password"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_password_hasher_holds_slot_until_timed_out_job_finishes():
+    from passwords import PasswordHasher, PasswordHasherBusy
+
+    hasher = PasswordHasher(workers=1, queue_size=0, timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(PasswordHasherBusy):
+            await hasher._submit(time.sleep, 0.3)
+        # Потік ще спить, тож нове завдання не потрапляє в пул.
+        assert hasher.stats()["pending"] == 1
+        with pytest.raises(PasswordHasherBusy):
+            await hasher._submit(time.sleep, 0)
+        await asyncio.sleep(0.35)
+        assert hasher.stats()["pending"] == 0
+        assert await hasher._submit(sum, [1, 2]) == 3
+
+    asyncio.run(scenario())
+    assert hasher.stats()["rejected"] == 2
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def smtp_settings(port):
+    from fastapi_mail import ConnectionConfig
+
+    return ConnectionConfig(
+        MAIL_USERNAME="", MAIL_PASSWORD="", MAIL_FROM="noreply@example.com",
+        MAIL_SERVER="127.0.0.1", MAIL_PORT=port, MAIL_STARTTLS=False, MAIL_SSL_TLS=False,
+        USE_CREDENTIALS=False, VALIDATE_CERTS=False,
+    )
+
+def test_confirmation_email_goes_through_outbox(client, db, test_user):
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    from models import OutboxMessage
+    from outbox import OutboxDispatcher
+
+    class Inbox:
+        def __init__(self):
+            self.envelopes = []
+
+        async def handle_DATA(self, server, session, envelope):
+            self.envelopes.append(envelope)
+            return "250 OK"
+
+    response = client.post(f"/send-confirmation-email/?email={test_user.email}")
+    assert response.status_code == 200
+    queued = db.query(OutboxMessage).filter(OutboxMessage.recipient == test_user.email).all()
+    assert [message.status for message in queued] == ["pending"]
+
+    inbox = Inbox()
+    controller = controller_module.Controller(inbox, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    try:
+        dispatcher = OutboxDispatcher(SessionLocal, smtp_settings(controller.port))
+
+        async def drain():
+            try:
+                return await dispatcher.drain_once()
+            finally:
+                await dispatcher.close()
+
+        assert asyncio.run(drain()) == 1
+    finally:
+        controller.stop()
+
+    assert [envelope.rcpt_tos for envelope in inbox.envelopes] == [[test_user.email]]
+    db.refresh(queued[0])
+    assert queued[0].status == "sent"
+
+def test_outbox_backs_off_when_smtp_is_down(db):
+    import crud
+    import schemas
+    from outbox import OutboxDispatcher
+
+    messages = [
+        crud.enqueue_email(db, schemas.EmailMessage(recipient=f"down{index}@example.com", subject="s", body="b"))
+        for index in range(3)
+    ]
+    dispatcher = OutboxDispatcher(SessionLocal, smtp_settings(free_port()), batch_size=3, backoff_base=60)
+    assert asyncio.run(dispatcher.drain_once()) == 0
+    assert asyncio.run(dispatcher.drain_once()) == 0
+    assert dispatcher.connection_failures == 2
+    assert dispatcher.connection_delay() == 120
+
+    # Листи не надсилались, тож їхні спроби не витрачено.
+    for message in messages:
+        db.refresh(message)
+        assert (message.status, message.attempts) == ("pending", 0)
+
+def test_outbox_stops_batch_on_lost_connection_and_login_failure(db, monkeypatch):
+    import aiosmtplib
+    import crud
+    import schemas
+    from models import OutboxMessage
+    from outbox import OutboxDispatcher
+
+    # Листи попередніх тестів не потрапляють у пакет.
+    db.query(OutboxMessage).filter(OutboxMessage.status == "pending").update({"status": "failed"})
+    db.commit()
+    messages = [
+        crud.enqueue_email(db, schemas.EmailMessage(recipient=f"lost{index}@example.com", subject="s", body="b"))
+        for index in range(4)
+    ]
+    dispatcher = OutboxDispatcher(SessionLocal, smtp_settings(free_port()), batch_size=4, backoff_base=60)
+
+    class DroppingSMTP:
+        sent = 0
+
+        async def send_message(self, message):
+            DroppingSMTP.sent += 1
+            if DroppingSMTP.sent == 2:
+                raise aiosmtplib.SMTPServerDisconnected("Connection lost")
+
+    async def connection():
+        return DroppingSMTP()
+
+    monkeypatch.setattr(dispatcher, "_connection", connection)
+    # Пакет обривається на другому листі, тож run() не запускає наступний прохід одразу.
+    assert asyncio.run(dispatcher.drain_once()) == 2
+    for message in messages:
+        db.refresh(message)
+    assert [(message.status, message.attempts) for message in messages] == [
+        ("sent", 1), ("pending", 1), ("pending", 0), ("pending", 0)
+    ]
+
+    logins = []
+
+    async def refused():
+        logins.append(1)
+        raise aiosmtplib.SMTPAuthenticationError(535, "Authentication failed")
+
+    monkeypatch.setattr(dispatcher, "_connection", refused)
+    assert asyncio.run(dispatcher.drain_once()) == 0
+    assert len(logins) == 1 and dispatcher.connection_failures == 1
+    for message in messages[2:]:
+        db.refresh(message)
+        assert message.attempts == 0
+
+def test_update_avatar_resizes_and_deduplicates(client, access_token, tmp_path, monkeypatch):
+    from PIL import Image
+    import avatars
+
+    class CountingStorage(avatars.LocalStorage):
+        saves = 0
+
+        def save(self, key, data):
+            CountingStorage.saves += 1
+            return super().save(key, data)
+
+    monkeypatch.setattr(avatars, "storage", CountingStorage(str(tmp_path), "/avatars"))
+    image = io.BytesIO()
+    Image.new("RGB", (1200, 800), "orange").save(image, format="PNG")
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    urls = []
+    for _ in range(2):
+        response = client.post(
+            "/update-avatar/",
+            headers=headers,
+            files={"file": ("avatar.png", image.getvalue(), "image/png")}
+        )
+        assert response.status_code == 200
+        urls.append(response.json()["avatar_url"])
+
+    assert urls[0] == urls[1]
+    assert CountingStorage.saves == 1
+    with Image.open(tmp_path / urls[0].rsplit("/", 1)[1]) as stored:
+        assert stored.size == (avatars.AVATAR_SIZE, avatars.AVATAR_SIZE)
+
+    response = client.post(
+        "/update-avatar/",
+        headers=headers,
+        files={"file": ("avatar.png", b"not an image", "image/png")}
+    )
+    assert response.status_code == 400
+
+    # Понад подвійний ліміт пікселів Pillow кидає DecompressionBombError.
+    bomb = io.BytesIO()
+    Image.new("RGB", (1200, 800), "purple").save(bomb, format="PNG")
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1200 * 800 // 3)
+    response = client.post(
+        "/update-avatar/",
+        headers=headers,
+        files={"file": ("avatar.png", bomb.getvalue(), "image/png")}
+    )
+    assert response.status_code == 400
+
+def test_bulk_import_csv_reports_duplicates_and_invalid_rows(client, access_token):
+    body = (
+        "first_name,last_name,email,phone_number,birth_date\n"
+        'Bulk,"Smith, Jr.",bulk1@example.com,100,1990-01-01\n'
+        "John,Doe,johndoe@example.com,101,1990-01-01\n"
+        "Bad,Date,bulk2@example.com,102,not-a-date\n"
+        'Multi,"Line\nName",bulk3@example.com,103,1991-02-03\n'
+    )
+    response = client.post(
+        "/contacts/bulk",
+        headers={"Authorization": f"Bearer {access_token}", "Content-Type": "text/csv"},
+        content=body.encode()
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["inserted"], result["duplicates"], result["invalid"]) == (2, 1, 1)
+    assert [(error["line"], error["email"]) for error in result["errors"]] == [
+        (3, "johndoe@example.com"), (4, "bulk2@example.com")
+    ]
+
+def test_bulk_import_ndjson(client, access_token):
+    body = "\n".join(json.dumps({
+        "first_name": "Nd", "last_name": f"Json{i}", "email": f"ndjson{i}@example.com",
+        "phone_number": str(i), "birth_date": "1980-12-31"
+    }) for i in range(3)) + "\n{broken"
+    response = client.post(
+        "/contacts/bulk?format=ndjson",
+        headers={"Authorization": f"Bearer {access_token}"},
+        content=body.encode()
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["inserted"], result["duplicates"], result["invalid"]) == (3, 0, 1)
+
+def test_bulk_import_splits_inserts_and_rejects_non_utf8(client, access_token, monkeypatch):
+    import crud
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    # Десять колонок на рядок: не більше двох рядків в одному INSERT.
+    monkeypatch.setitem(crud.MAX_BIND_PARAMETERS, engine.dialect.name, 25)
+    body = "\n".join(json.dumps({
+        "first_name": "Split", "last_name": f"Batch{i}", "email": f"split-batch{i}@example.com",
+        "phone_number": f"38050000070{i}", "birth_date": "1980-12-31"
+    }) for i in range(5))
+    response = client.post("/contacts/bulk?format=ndjson", headers=headers, content=body.encode())
+    assert response.status_code == 200
+    assert (response.json()["inserted"], response.json()["duplicates"]) == (5, 0)
+
+    body = "first_name,last_name,email,phone_number,birth_date\nJos\xe9,Latin1,latin1@example.com,1,1990-01-01\n"
+    response = client.post("/contacts/bulk?format=csv", headers=headers, content=body.encode("latin-1"))
+    assert response.status_code == 400
+    assert "UTF-8" in response.json()["detail"]
+
+def test_export_contacts(client, access_token, test_user):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.get("/contacts/export?format=csv", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["id", "first_name", "last_name", "email", "phone_number", "birth_date"]
+    assert "johndoe@example.com" in [row[3] for row in rows[1:]]
+
+    response = client.get("/contacts/export?format=ndjson", headers=headers)
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) == len(rows) - 1
+    assert all(set(record) == set(rows[0]) for record in records)
+
+def test_write_paths_report_statement_counts(client):
+    response = client.post("/register", json={"email": "budget@example.com", "password": "password"})
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Statements"]) <= 4
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+    response = client.post("/register", json={"email": "budget@example.com", "password": "password"})
+    assert response.status_code == 409
+    assert response.headers["X-DB-Statements"] == "1"
+
+    token = create_access_token(data={"sub": "budget@example.com"})
+    response = client.post(
+        "/contacts/",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"first_name": "Budget", "last_name": "Check", "email": "budget.contact@example.com",
+              "phone_number": "5550002222", "birth_date": "1992-03-04"}
+    )
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Statements"]) <= 4
+
 def test_cleanup(db):
     db.close()
 